@@ -0,0 +1,58 @@
+"""
+Vectorized version of evaluator.evaluate for scoring many hands at once.
+
+Takes an (N, 5..7) array of card ints (same encoding as shared.py) and
+returns an N-length int32 array of hand ranks, identical to calling
+evaluator.evaluate on each row. Uses the same tables as evaluator.py:
+the rank multiset key is summed per row and looked up with searchsorted,
+and each suit's rank mask goes through the flush table. A flush always
+outranks the best non-flush hand in <= 7 cards, so the two are combined
+with a max.
+"""
+
+import numpy as np
+
+import evaluator
+
+# rows scored per pass, bounds the size of the temporary arrays
+CHUNK_SIZE = 1 << 16
+
+_CARD_RANK_KEYS = np.array(
+    [evaluator.RANK_KEYS[card % evaluator.NUM_RANKS] for card in range(52)],
+    dtype=np.int64,
+)
+_CARD_SUITS = np.array([card // evaluator.NUM_RANKS for card in range(52)])
+_CARD_RANK_BITS = np.array(
+    [1 << (card % evaluator.NUM_RANKS) for card in range(52)], dtype=np.int64
+)
+_FLUSH_RANKS = np.array(evaluator.FLUSH_RANKS, dtype=np.int32)
+
+_keys = sorted(evaluator.RANK_COUNT_RANKS)
+_RANK_COUNT_KEYS = np.array(_keys, dtype=np.int64)
+_RANK_COUNT_RANKS = np.array(
+    [evaluator.RANK_COUNT_RANKS[key] for key in _keys], dtype=np.int32
+)
+del _keys
+
+
+def _evaluate_chunk(cards: np.ndarray) -> np.ndarray:
+    keys = _CARD_RANK_KEYS[cards].sum(axis=1)
+    ranks = _RANK_COUNT_RANKS[np.searchsorted(_RANK_COUNT_KEYS, keys)]
+    suits = _CARD_SUITS[cards]
+    rank_bits = _CARD_RANK_BITS[cards]
+    for suit in range(evaluator.NUM_SUITS):
+        suit_masks = np.where(suits == suit, rank_bits, 0).sum(axis=1)
+        np.maximum(ranks, _FLUSH_RANKS[suit_masks], out=ranks)
+    return ranks
+
+
+def evaluate_batch(cards) -> np.ndarray:
+    cards = np.asarray(cards, dtype=np.intp)
+    if cards.ndim != 2 or not 5 <= cards.shape[1] <= 7:
+        raise ValueError(f"expected an (N, 5..7) array of cards, got {cards.shape}")
+    ranks = np.empty(len(cards), dtype=np.int32)
+    for start in range(0, len(cards), CHUNK_SIZE):
+        ranks[start : start + CHUNK_SIZE] = _evaluate_chunk(
+            cards[start : start + CHUNK_SIZE]
+        )
+    return ranks
@@ -0,0 +1,187 @@
+"""
+Hand evaluator benchmark and correctness check.
+
+Builds a fixed, seeded corpus of 5, 6 and 7 card hands (plus hand-picked
+edge cases like wheels and kicker ties) and reports hands/sec for every
+evaluator: TableInfo.hand_strength, evaluator.evaluate,
+evaluator.evaluate_mask and, if NumPy is installed,
+batch_evaluator.evaluate_batch.
+
+Every evaluator must order the corpus exactly like evaluator.evaluate: the
+fast evaluators must return identical ranks, and hand_strength (run on a
+prefix of the corpus since it is hundreds of times slower) must sort hands
+the same way, ties included. Exits non-zero on any mismatch.
+
+    python3 bench/bench_hand_eval.py --hands 1000000
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+import evaluator
+from shared import TableInfo, PlayerInfo
+
+try:
+    import numpy as np
+    from batch_evaluator import evaluate_batch
+except ImportError:
+    np = None
+
+HAND_SIZES = (5, 6, 7)
+
+
+def parse_cards(text):
+    # "As Kd 5c ..." to card ints
+    return [
+        "shdc".index(card[1]) * 13 + "23456789TJQKA".index(card[0])
+        for card in text.split()
+    ]
+
+
+EDGE_CASES = [
+    parse_cards(hand)
+    for hand in [
+        "As 2d 3c 4h 5s",  # wheel
+        "6s 2d 3c 4h 5s",  # 6 high straight beats the wheel
+        "As 2s 3s 4s 5s",  # steel wheel is a straight flush, not a royal
+        "As Ks Qs Js Ts",
+        "Ah Kh Qh Jh Th 9h 8h",
+        "As Ad Ac Kh Kd 2c 2s",  # full house, not trips + two pair
+        "As Ad Ac Kh Kd Kc 2s",  # two sets make a full house
+        "As Ad Kc Kh Qd Qc 2s",  # three pair, best two + queen kicker
+        "As Ad Kc Kh Qd Qc Js",
+        "9s 9d 9c 9h 2d 3c Ks",  # quads, king kicker
+        "9s 9d 9c 9h Kd Kc Ks",
+        "As Kd 9c 7h 5s 3d 2c",  # high card, only the top 5 count
+        "As Kd 9c 7h 4s 3d 2c",
+        "2s 3s 4s 5s 7s 8d 9d",  # flush beats straight
+        "Ts Js Qs Ks 9d 8d As",
+    ]
+]
+
+
+def build_corpus(hands_per_size, seed):
+    rng = random.Random(seed)
+    deck = list(range(52))
+    corpus = {size: [] for size in HAND_SIZES}
+    for hand in EDGE_CASES:
+        corpus[len(hand)].append(hand)
+    for size in HAND_SIZES:
+        while len(corpus[size]) < hands_per_size:
+            corpus[size].append(rng.sample(deck, size))
+    return corpus
+
+
+def hand_strength_evaluator():
+    table_info = TableInfo(name="bench", num_seats=2, sm_blind=1, bg_blind=2)
+    player = PlayerInfo(name="bench", seat=0, sio_id=None)
+
+    def evaluate_hands(hands):
+        ranks = []
+        for hand in hands:
+            player.hole_cards = hand[:2]
+            table_info.community_cards = hand[2:]
+            ranks.append(table_info.hand_strength(player))
+        return ranks
+
+    return evaluate_hands
+
+
+def evaluate_masks(masks):
+    evaluate_mask = evaluator.evaluate_mask
+    return [evaluate_mask(mask) for mask in masks]
+
+
+def evaluate_lists(hands):
+    evaluate = evaluator.evaluate
+    return [evaluate(hand) for hand in hands]
+
+
+def timed(fn, arg):
+    start_time = time.perf_counter()
+    result = fn(arg)
+    return result, time.perf_counter() - start_time
+
+
+def same_ordering(reference, ranks):
+    # same order and same ties when both sort by the reference
+    pairs = sorted(zip(reference, ranks), key=lambda pair: pair[0])
+    for (ref_a, rank_a), (ref_b, rank_b) in zip(pairs, pairs[1:]):
+        if (ref_a == ref_b) != (rank_a == rank_b) or rank_a > rank_b:
+            return False
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--hands", type=int, default=1_000_000, help="per hand size")
+    parser.add_argument(
+        "--reference-hands",
+        type=int,
+        default=20_000,
+        help="per hand size, for the slow hand_strength",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"building corpus: {args.hands} hands of each size, seed {args.seed}")
+    corpus = build_corpus(args.hands, args.seed)
+    failed = False
+    for size in HAND_SIZES:
+        hands = corpus[size]
+        masks = [evaluator.cards_to_mask(hand) for hand in hands]
+        print(f"\n{size} card hands")
+
+        expected, elapsed = timed(evaluate_lists, hands)
+        results = [("evaluator.evaluate", len(hands), elapsed, True)]
+
+        ranks, elapsed = timed(evaluate_masks, masks)
+        results.append(
+            ("evaluator.evaluate_mask", len(hands), elapsed, ranks == expected)
+        )
+
+        if np is not None:
+            hand_array = np.array(hands, dtype=np.intp)
+            ranks, elapsed = timed(evaluate_batch, hand_array)
+            results.append(
+                (
+                    "batch_evaluator.evaluate_batch",
+                    len(hands),
+                    elapsed,
+                    ranks.tolist() == expected,
+                )
+            )
+
+        reference_hands = hands[: args.reference_hands]
+        ranks, elapsed = timed(hand_strength_evaluator(), reference_hands)
+        results.append(
+            (
+                "TableInfo.hand_strength",
+                len(reference_hands),
+                elapsed,
+                same_ordering(ranks, expected[: len(reference_hands)]),
+            )
+        )
+
+        for name, num_hands, elapsed, ok in results:
+            print(
+                f"  {name:32} {num_hands / elapsed:>14,.0f} hands/sec"
+                f"  {'ok' if ok else 'MISMATCH'}"
+            )
+            failed = failed or not ok
+
+    if np is None:
+        print("\nNumPy not installed, skipped batch_evaluator")
+    if failed:
+        print("\nevaluators disagree on hand ordering")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,6 @@
 #!/usr/bin/env python3
 
-# DONT REMOVE!! Version Identifier: |=V=| VERSION 3 |=V=|
+# DONT REMOVE!! Version Identifier: |=V=| VERSION 8 |=V=|
 
 import curses
 import subprocess
@@ -19,6 +19,10 @@ from shared import (
     ClientNextAction,
     ClientPlayerState,
     PlayerState,
+    apply_private_view,
+    TableViewStore,
+    BINARY_WIRE_FORMAT,
+    decode_wire,
 )
 
 import socketio
@@ -1128,8 +1132,41 @@ def seatbox_ind_from_seat(seat):
         return seat
 
 
-@sio.on("updated_table_info")
-def on_updated_table_info(data):
+# the table's public view, patched as updates arrive, and our latest private view
+table_view_store = TableViewStore()
+private_table_info = None
+
+
+def show_table_info_if_current():
+    public_view = table_view_store.view
+    if public_view is None:
+        return
+    if private_table_info is None:
+        # not seated, nothing private is coming
+        show_table_info(public_view)
+    elif private_table_info["view_num"] == table_view_store.view_num:
+        show_table_info(apply_private_view(public_view, private_table_info))
+
+
+@sio.on("public_table_info")
+def on_public_table_info(data):
+    if isinstance(data, bytes):
+        data = decode_wire(data)
+    if table_view_store.receive(data):
+        sio.emit("resync_table_view")
+    show_table_info_if_current()
+
+
+@sio.on("private_table_info")
+def on_private_table_info(data):
+    global private_table_info
+    if isinstance(data, bytes):
+        data = decode_wire(data)
+    private_table_info = data
+    show_table_info_if_current()
+
+
+def show_table_info(data):
     global client_player_action
     global my_seat
     # print(data, file=sys.stderr)
@@ -1251,6 +1288,14 @@ def on_updated_table_info(data):
                 last_action_text = f"Bet {player['current_bet']}"
             elif p_state == PlayerState.RAISED:
                 last_action_text = f"Raised to {player['current_bet']}"
+            if player.get("equity") is not None:
+                equity_text = f"{round(100 * player['equity']['win'])}%"
+                if player["equity"]["tie"] > 0:
+                    equity_text += f" (tie {round(100 * player['equity']['tie'])}%)"
+                if last_action_text != None:
+                    last_action_text += f" - {equity_text}"
+                else:
+                    last_action_text = equity_text
             if last_action_text != None:
                 form.SeatBoxes[seatbox_ind_from_seat(seat)].footer = last_action_text
 
@@ -1265,6 +1310,17 @@ def connect_to_server():
     auto_update = "--no-auto-update" not in sys.argv
     if "--no-auto-update" in sys.argv:
         sys.argv.remove("--no-auto-update")
+    # table updates in the binary wire format unless --json,
+    # servers that don't know it send JSON anyway
+    auth = {"wire_format": BINARY_WIRE_FORMAT}
+    if "--json" in sys.argv:
+        sys.argv.remove("--json")
+        auth["wire_format"] = "json"
+    # join a specific table, otherwise the server's default one
+    if "--table" in sys.argv:
+        ind = sys.argv.index("--table")
+        auth["table"] = sys.argv[ind + 1]
+        del sys.argv[ind : ind + 2]
     if auto_update:
         if get_latest_version():
             print("Updated to latest version, please try again.")
@@ -1278,7 +1334,7 @@ def connect_to_server():
     else:
         address = "localhost"
         port = 8000
-    sio.connect(f"http://{address}:{port}")
+    sio.connect(f"http://{address}:{port}", auth=auth)
 
 
 if __name__ == "__main__":
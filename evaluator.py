@@ -0,0 +1,214 @@
+"""
+Table-driven poker hand evaluator.
+
+Scores 5, 6 or 7 card hands with a handful of table lookups and returns a
+single int, higher is better (1 = 7-5-4-3-2 offsuit, 7462 = royal flush).
+
+Two tables are built once at import:
+  - FLUSH_RANKS: indexed by a 13-bit mask of the ranks held in one suit,
+    gives the best flush/straight flush for that mask (0 if < 5 cards).
+  - RANK_COUNT_RANKS: indexed by a perfect hash of the rank multiset
+    (3 bits per rank holding its count), gives the best non-flush hand.
+With 7 cards a flush can never coexist with quads or a full house,
+so if any suit holds 5+ cards the flush table alone decides the hand.
+
+Cards use the same encoding as shared.py: ints 0-51 (suit * 13 + rank),
+or a 64-bit hand mask with one 16 bit lane of rank bits per suit.
+"""
+
+from itertools import combinations_with_replacement
+from typing import Dict, List
+
+NUM_RANKS = 13
+NUM_SUITS = 4
+ACE = 12
+SUIT_MASK = (1 << NUM_RANKS) - 1
+
+HIGH_CARD = 1
+PAIR = 2
+TWO_PAIR = 3
+THREE_OF_A_KIND = 4
+STRAIGHT = 5
+FLUSH = 6
+FULL_HOUSE = 7
+FOUR_OF_A_KIND = 8
+STRAIGHT_FLUSH = 9
+
+# adding RANK_KEYS[rank] for every card gives the rank multiset key
+RANK_KEYS = [1 << (3 * rank) for rank in range(NUM_RANKS)]
+
+# 5 consecutive ranks ending at high, wheel (A-2-3-4-5) has high 3
+_STRAIGHT_MASKS = [(0b11111 << (high - 4), high) for high in range(ACE, 3, -1)] + [
+    ((1 << ACE) | 0b1111, 3)
+]
+
+
+def _straight_high(mask: int):
+    for straight_mask, high in _STRAIGHT_MASKS:
+        if mask & straight_mask == straight_mask:
+            return high
+    return None
+
+
+def _ranks_desc(mask: int) -> List[int]:
+    return [rank for rank in range(ACE, -1, -1) if mask & (1 << rank)]
+
+
+"""
+Raw scores order hands correctly but are sparse, they're only used to build
+the tables: category in the top bits, then up to 5 ranks as 4 bit nibbles.
+"""
+
+
+def _score(category: int, ranks: List[int]) -> int:
+    score = category
+    for i in range(5):
+        score = (score << 4) | (ranks[i] if i < len(ranks) else 0)
+    return score
+
+
+def _best_flush_score(mask: int) -> int:
+    high = _straight_high(mask)
+    if high is not None:
+        return _score(STRAIGHT_FLUSH, [high])
+    return _score(FLUSH, _ranks_desc(mask)[:5])
+
+
+def _best_non_flush_score(counts: List[int]) -> int:
+    # groups[n] holds the ranks appearing exactly n times, highest first
+    groups = ([], [], [], [], [])
+    mask = 0
+    for rank in range(ACE, -1, -1):
+        if counts[rank]:
+            groups[counts[rank]].append(rank)
+            mask |= 1 << rank
+    singles, pairs, trips, quads = groups[1], groups[2], groups[3], groups[4]
+
+    if quads:
+        kicker = max(r for r in _ranks_desc(mask) if r != quads[0])
+        return _score(FOUR_OF_A_KIND, [quads[0], kicker])
+    if trips and len(trips) + len(pairs) >= 2:
+        return _score(FULL_HOUSE, [trips[0], max(trips[1:] + pairs)])
+    high = _straight_high(mask)
+    if high is not None:
+        return _score(STRAIGHT, [high])
+    if trips:
+        return _score(THREE_OF_A_KIND, [trips[0]] + singles[:2])
+    if len(pairs) >= 2:
+        kicker = max(pairs[2:] + singles)
+        return _score(TWO_PAIR, [pairs[0], pairs[1], kicker])
+    if pairs:
+        return _score(PAIR, [pairs[0]] + singles[:3])
+    return _score(HIGH_CARD, singles[:5])
+
+
+def _build_tables():
+    flush_scores = [0] * (1 << NUM_RANKS)
+    for mask in range(1 << NUM_RANKS):
+        if bin(mask).count("1") >= 5:
+            flush_scores[mask] = _best_flush_score(mask)
+
+    rank_count_scores: Dict[int, int] = {}
+    five_card_scores = set(flush_scores) - {0}
+    for size in (5, 6, 7):
+        for multiset in combinations_with_replacement(range(NUM_RANKS), size):
+            counts = [0] * NUM_RANKS
+            for rank in multiset:
+                counts[rank] += 1
+            if max(counts) > 4:
+                continue
+            score = _best_non_flush_score(counts)
+            rank_count_scores[sum(RANK_KEYS[rank] for rank in multiset)] = score
+            # every best hand is some 5 card hand, so these are all of them
+            if size == 5:
+                five_card_scores.add(score)
+    dense = {score: i + 1 for i, score in enumerate(sorted(five_card_scores))}
+
+    flush_ranks = [dense[s] if s else 0 for s in flush_scores]
+    rank_count_ranks = {key: dense[s] for key, s in rank_count_scores.items()}
+    return flush_ranks, rank_count_ranks, sorted(dense)
+
+
+FLUSH_RANKS, RANK_COUNT_RANKS, _SCORES = _build_tables()
+NUM_HAND_RANKS = len(_SCORES)  # 7462
+
+# rank multiset key of all the ranks set in a 13-bit suit mask
+SUIT_MASK_KEYS = [
+    sum(RANK_KEYS[rank] for rank in range(NUM_RANKS) if mask & (1 << rank))
+    for mask in range(1 << NUM_RANKS)
+]
+# hand mask bit of each card int
+CARD_BITS = [1 << (16 * (card // NUM_RANKS) + card % NUM_RANKS) for card in range(52)]
+
+
+def cards_to_mask(cards) -> int:
+    mask = 0
+    for card in cards:
+        mask |= CARD_BITS[card]
+    return mask
+
+
+def evaluate_mask(mask: int) -> int:
+    # mask holds 5 to 7 cards
+    key = 0
+    for suit in range(NUM_SUITS):
+        suit_mask = (mask >> (16 * suit)) & SUIT_MASK
+        flush_rank = FLUSH_RANKS[suit_mask]
+        if flush_rank:
+            return flush_rank
+        key += SUIT_MASK_KEYS[suit_mask]
+    return RANK_COUNT_RANKS[key]
+
+
+def evaluate(cards) -> int:
+    # cards are ints 0-51, 5 to 7 of them
+    return evaluate_mask(cards_to_mask(cards))
+
+
+def hand_category(hand_rank: int) -> int:
+    return _SCORES[hand_rank - 1] >> 20
+
+
+RANK_NAMES = [
+    "Two",
+    "Three",
+    "Four",
+    "Five",
+    "Six",
+    "Seven",
+    "Eight",
+    "Nine",
+    "Ten",
+    "Jack",
+    "Queen",
+    "King",
+    "Ace",
+]
+RANK_PLURALS = [name + "s" for name in RANK_NAMES]
+RANK_PLURALS[4] = "Sixes"
+
+
+def hand_name(hand_rank: int) -> str:
+    score = _SCORES[hand_rank - 1]
+    category = score >> 20
+    # top ranks of the hand in the order _score packed them
+    first, second = (score >> 16) & 0xF, (score >> 12) & 0xF
+    if category == STRAIGHT_FLUSH:
+        if first == ACE:
+            return "Royal Flush"
+        return f"Straight Flush, {RANK_NAMES[first]} High"
+    if category == FOUR_OF_A_KIND:
+        return f"Four of a Kind, {RANK_PLURALS[first]}"
+    if category == FULL_HOUSE:
+        return f"Full House, {RANK_PLURALS[first]} full of {RANK_PLURALS[second]}"
+    if category == FLUSH:
+        return f"Flush, {RANK_NAMES[first]} High"
+    if category == STRAIGHT:
+        return f"Straight, {RANK_NAMES[first]} High"
+    if category == THREE_OF_A_KIND:
+        return f"Three of a Kind, {RANK_PLURALS[first]}"
+    if category == TWO_PAIR:
+        return f"Two Pair, {RANK_PLURALS[first]} and {RANK_PLURALS[second]}"
+    if category == PAIR:
+        return f"Pair of {RANK_PLURALS[first]}"
+    return f"High Card, {RANK_NAMES[first]}"
@@ -0,0 +1,357 @@
+"""
+Runs one table set across several server.py nodes.
+
+Nodes share a socket.io client manager backed by a message bus, so an emit
+reaches its client whichever node the client is connected to. Each table
+is owned by exactly one node, picked by consistent hashing of the table
+name over the node list, and only the owner runs its game loop. Inbound
+events are forwarded over the same bus to the owner of the table, so a
+client can connect to any node.
+
+The bus is pluggable: redis://... uses socketio's Redis manager (needs the
+redis package), loopback://host:port uses the small broker in this file,
+which any node can host with --broker or can be run on its own:
+    python3 cluster.py --port 6390
+    python3 server.py --port 8000 --node a --nodes a,b --message-queue loopback://127.0.0.1:6390 --broker
+    python3 server.py --port 8001 --node b --nodes a,b --message-queue loopback://127.0.0.1:6390
+"""
+
+import argparse
+import asyncio
+import bisect
+import hashlib
+import itertools
+import pickle
+import urllib.parse
+from typing import Dict, List
+
+import socketio
+from socketio.async_pubsub_manager import AsyncPubSubManager
+
+from fanout import OutboxManager
+
+# virtual nodes per node, more spreads tables more evenly
+RING_REPLICAS = 64
+# seconds to wait on another node before giving up on it
+NODE_CALL_TIMEOUT = 5
+RECONNECT_DELAY = 1
+DEFAULT_BROKER_PORT = 6390
+# bus messages for table routing, everything else is socketio's
+TABLE_OP = "table_op"
+TABLE_OP_REPLY = "table_op_reply"
+
+
+def _ring_hash(key: str) -> int:
+    return int.from_bytes(hashlib.sha1(key.encode()).digest()[:8], "big")
+
+
+class HashRing:
+    def __init__(self, nodes: List[str], replicas=RING_REPLICAS):
+        self.nodes = list(nodes)
+        points = sorted(
+            (_ring_hash(f"{node}#{i}"), node)
+            for node in self.nodes
+            for i in range(replicas)
+        )
+        self.hashes = [h for h, _ in points]
+        self.owners = [node for _, node in points]
+
+    def owner(self, key: str) -> str:
+        # first point clockwise from the key
+        ind = bisect.bisect(self.hashes, _ring_hash(key)) % len(self.hashes)
+        return self.owners[ind]
+
+
+""" Loopback broker, relays every frame to every connected node. """
+
+
+async def _read_frame(reader):
+    header = await reader.readexactly(4)
+    return header + await reader.readexactly(int.from_bytes(header, "big"))
+
+
+def _frame(payload) -> bytes:
+    data = pickle.dumps(payload)
+    return len(data).to_bytes(4, "big") + data
+
+
+async def start_broker(host="127.0.0.1", port=DEFAULT_BROKER_PORT):
+    writers = set()
+
+    async def relay(reader, writer):
+        writers.add(writer)
+        try:
+            while True:
+                frame = await _read_frame(reader)
+                for other in list(writers):
+                    other.write(frame)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        except asyncio.CancelledError:
+            # shutting down, asyncio would log the cancelled handler otherwise
+            pass
+        finally:
+            writers.discard(writer)
+            writer.close()
+
+    server = await asyncio.start_server(relay, host, port)
+    print(f"loopback broker listening on {host}:{port}")
+    return server
+
+
+class TableRoutingMixin:
+    # set by NodeTables, gets every table routing message from the bus
+    on_table_message = None
+
+    async def publish_table_message(self, message):
+        await self._publish(message)
+
+    async def _listen(self):
+        async for message in super()._listen():
+            data = message
+            if isinstance(message, bytes):
+                try:
+                    data = pickle.loads(message)
+                except Exception:
+                    pass
+            if isinstance(data, dict) and data.get("method") in (
+                TABLE_OP,
+                TABLE_OP_REPLY,
+            ):
+                if self.on_table_message is not None:
+                    asyncio.create_task(self.on_table_message(data))
+                continue
+            yield message
+
+
+class LoopbackManager(AsyncPubSubManager):
+    name = "loopback"
+
+    def __init__(
+        self,
+        url=f"loopback://127.0.0.1:{DEFAULT_BROKER_PORT}",
+        channel="socketio",
+        write_only=False,
+        logger=None,
+    ):
+        super().__init__(channel=channel, write_only=write_only, logger=logger)
+        parsed = urllib.parse.urlparse(url)
+        self.host = parsed.hostname or "127.0.0.1"
+        self.port = parsed.port or DEFAULT_BROKER_PORT
+        self.reader = None
+        self.writer = None
+        self.connect_lock = asyncio.Lock()
+
+    async def _connect(self):
+        async with self.connect_lock:
+            while self.writer is None:
+                try:
+                    self.reader, self.writer = await asyncio.open_connection(
+                        self.host, self.port
+                    )
+                except OSError:
+                    print(f"can't reach broker at {self.host}:{self.port}, retrying")
+                    await asyncio.sleep(RECONNECT_DELAY)
+
+    def _reset(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+
+    async def _publish(self, data):
+        await self._connect()
+        self.writer.write(_frame((self.channel, data)))
+        try:
+            await self.writer.drain()
+        except ConnectionError:
+            print("lost the broker, message dropped")
+            self._reset()
+
+    async def _listen(self):
+        while True:
+            await self._connect()
+            try:
+                while True:
+                    frame = await _read_frame(self.reader)
+                    channel, data = pickle.loads(frame[4:])
+                    if channel == self.channel:
+                        yield data
+            except (asyncio.IncompleteReadError, ConnectionError):
+                print("lost the broker, reconnecting")
+                self._reset()
+                await asyncio.sleep(RECONNECT_DELAY)
+
+
+# OutboxManager last, so it delivers what arrives over the bus to this node's clients
+class RoutedLoopbackManager(TableRoutingMixin, LoopbackManager, OutboxManager):
+    pass
+
+
+class RoutedRedisManager(
+    TableRoutingMixin, socketio.AsyncRedisManager, OutboxManager
+):
+    pass
+
+
+def make_client_manager(url):
+    if url.startswith("loopback://"):
+        return RoutedLoopbackManager(url)
+    if url.startswith(("redis://", "rediss://")):
+        return RoutedRedisManager(url)
+    raise ValueError(f"unsupported message queue {url}")
+
+
+""" Swaps the client manager of a server that hasn't started serving yet. """
+
+
+def use_client_manager(sio: socketio.AsyncServer, manager):
+    sio.manager = manager
+    manager.set_server(sio)
+    # start listening now, not on the first connect, tables may be owned here
+    manager.initialize()
+    sio.manager_initialized = True
+
+
+class NodeTables:
+    # routes table operations to the node that owns the table, local_tables
+    # (LocalTables or ShardedTables) runs the ones owned here
+    def __init__(self, local_tables, node: str, ring: HashRing, manager):
+        self.local_tables = local_tables
+        self.node = node
+        self.ring = ring
+        self.manager = manager
+        manager.on_table_message = self.on_table_message
+        self.node_by_sid: Dict[str, str] = {}
+        self.pending: Dict[int, asyncio.Future] = {}
+        self.req_ids = itertools.count()
+
+    def owns(self, table_name):
+        return self.ring.owner(table_name) == self.node
+
+    async def on_table_message(self, message):
+        if message.get("node") != self.node:
+            return
+        if message["method"] == TABLE_OP_REPLY:
+            future = self.pending.pop(message["req_id"], None)
+            if future is not None and not future.done():
+                future.set_result(message["result"])
+            return
+        result = await getattr(self.local_tables, message["op"])(*message["args"])
+        if message["req_id"] is not None:
+            await self.manager.publish_table_message(
+                {
+                    "method": TABLE_OP_REPLY,
+                    "node": message["from"],
+                    "req_id": message["req_id"],
+                    "result": result,
+                }
+            )
+
+    async def call(self, node, op, *args):
+        if node == self.node:
+            return await getattr(self.local_tables, op)(*args)
+        req_id = next(self.req_ids)
+        future = asyncio.get_running_loop().create_future()
+        self.pending[req_id] = future
+        await self.manager.publish_table_message(
+            {
+                "method": TABLE_OP,
+                "node": node,
+                "from": self.node,
+                "req_id": req_id,
+                "op": op,
+                "args": args,
+            }
+        )
+        try:
+            return await asyncio.wait_for(future, NODE_CALL_TIMEOUT)
+        finally:
+            self.pending.pop(req_id, None)
+
+    async def notify(self, node, op, *args):
+        # no reply wanted
+        if node == self.node:
+            await getattr(self.local_tables, op)(*args)
+            return
+        await self.manager.publish_table_message(
+            {
+                "method": TABLE_OP,
+                "node": node,
+                "from": self.node,
+                "req_id": None,
+                "op": op,
+                "args": args,
+            }
+        )
+
+    async def join_table(self, table_name, sid):
+        node = self.ring.owner(table_name)
+        try:
+            error = await self.call(node, "join_table", table_name, sid)
+        except asyncio.TimeoutError:
+            return f"node {node} hosting {table_name} isn't responding"
+        if error is None:
+            self.node_by_sid[sid] = node
+        return error
+
+    async def leave_table(self, sid):
+        node = self.node_by_sid.pop(sid, None)
+        if node is not None:
+            await self.notify(node, "leave_table", sid)
+
+    async def player_action(self, sid, event, data):
+        node = self.node_by_sid.get(sid)
+        if node is not None:
+            await self.notify(node, "player_action", sid, event, data)
+
+    async def resync_table_view(self, sid):
+        node = self.node_by_sid.get(sid)
+        if node is None:
+            return None
+        try:
+            return await self.call(node, "resync_table_view", sid)
+        except asyncio.TimeoutError:
+            return None
+
+    async def create_table(self, table_config):
+        node = self.ring.owner(table_config["name"])
+        try:
+            return await self.call(node, "create_table", table_config)
+        except asyncio.TimeoutError:
+            return f"node {node} isn't responding"
+
+    async def close_table(self, name):
+        try:
+            return await self.call(self.ring.owner(name), "close_table", name)
+        except asyncio.TimeoutError:
+            return None
+
+    async def list_tables(self):
+        results = await asyncio.gather(
+            *[self.call(node, "list_tables") for node in self.ring.nodes],
+            return_exceptions=True,
+        )
+        # a node that isn't responding just doesn't list its tables
+        return [
+            table
+            for result in results
+            if isinstance(result, list)
+            for table in result
+        ]
+
+    def shutdown(self):
+        self.local_tables.shutdown()
+
+
+async def run_broker(host, port):
+    server = await start_broker(host, port)
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="run the loopback broker")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_BROKER_PORT)
+    args = parser.parse_args()
+    asyncio.run(run_broker(args.host, args.port))
@@ -0,0 +1,317 @@
+"""
+Headless engine for one table: the game flow without sockets, sleeps or
+prints, so bots and analytics can play hands as fast as the CPU allows.
+
+    engine = Engine(table_info)
+    result = engine.step()
+    while result.player is not None:
+        result = engine.step(ClientNextAction(ClientNextActionType.CALL))
+
+The server is a thin adapter around it: it calls advance() for one state
+transition at a time so it can pace the game and send views in between,
+and queues actions as they arrive from clients.
+"""
+
+import logging
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from shared import (
+    TableInfo,
+    GameState,
+    PlayerState,
+    PlayerInfo,
+    ClientPlayerAction,
+    ClientNextAction,
+    ACTION_TIMEOUT,
+)
+
+logger = logging.getLogger(__name__)
+
+# a hand is a few dozen transitions, more than this without needing input is a bug
+MAX_TRANSITIONS_PER_STEP = 10_000
+
+
+class StepResult:
+    def __init__(self, table_info: TableInfo, player: PlayerInfo):
+        self.table_info = table_info
+        # who has to act next, None if the table is waiting for players to join
+        self.player = player
+
+    @property
+    def player_action(self) -> ClientPlayerAction:
+        return None if self.player is None else self.player.client_player_action
+
+
+class HandResult:
+    def __init__(self, hand_num, pot, showdown, net):
+        self.hand_num = hand_num
+        self.pot = pot  # chips paid out
+        self.showdown = showdown  # True if more than one hand was shown
+        self.net = net  # player name to chips won (or lost) this hand
+
+
+class Engine:
+    def __init__(
+        self,
+        table_info: TableInfo,
+        clock=None,
+        on_equity_changed=None,
+        on_hand_finished=None,
+    ):
+        self.table_info = table_info
+        # without a clock time stands still, so nobody ever times out.
+        # the server passes time.time, replays the recorded time
+        self.now = 0.0
+        table_info.clock = clock if clock is not None else self.virtual_clock
+        # called with the table when all-in equity needs recalculating
+        self.on_equity_changed = on_equity_changed
+        # called with a HandResult after each hand is paid out
+        self.on_hand_finished = on_hand_finished
+        self.starting_stacks = {}
+
+    def virtual_clock(self):
+        return self.now
+
+    def advance_clock(self, seconds):
+        self.now += seconds
+
+    def equity_changed(self):
+        table_info = self.table_info
+        # only all-ins with cards still to come have an equity worth showing,
+        # with the whole board out the hands just get compared
+        if (
+            self.on_equity_changed is not None
+            and table_info.num_players_by_state[PlayerState.ALL_IN] > 0
+            and len(table_info.community_cards) < 5
+        ):
+            self.on_equity_changed(table_info)
+
+    def hand_result(self, pot) -> HandResult:
+        table_info = self.table_info
+        return HandResult(
+            hand_num=table_info.hand_num,
+            pot=pot,
+            showdown=sum(p.hole_cards_face_up for p in table_info.players) > 1,
+            net={
+                p.name: p.stack - self.starting_stacks[p.name]
+                for p in table_info.players
+                if p.name in self.starting_stacks
+            },
+        )
+
+    def player_to_act(self) -> PlayerInfo:
+        table_info = self.table_info
+        if table_info.game_state != GameState.PROCESS_ACTIONS:
+            return None
+        p = table_info.get_player_at_seat(table_info.action_on)
+        if p is None or p.client_player_action is None:
+            return None
+        return p
+
+    """ Queues the action of the player being asked to act, returns False if nobody is. """
+
+    def queue_action(self, player: PlayerInfo, action: ClientNextAction):
+        if player is None or player.client_player_action is None:
+            return False
+        player.client_player_action.next_action = action
+        return True
+
+    """
+    Returns None if another advance() would make progress right away,
+    otherwise the seconds until a timer fires (inf if there is none).
+    """
+
+    def seconds_until_input_needed(self):
+        table_info = self.table_info
+        if table_info.game_state == GameState.BEFORE_HAND:
+            # can't start a hand until someone else joins
+            if table_info.get_num_active_players() < 2:
+                return float("inf")
+        elif table_info.game_state == GameState.PROCESS_ACTIONS:
+            p = self.player_to_act()
+            if p is not None and p.client_player_action.next_action is None:
+                # wait for their action, or until they time out
+                return max(
+                    0, p.action_start_time + ACTION_TIMEOUT - table_info.clock()
+                )
+        return None
+
+    """
+    Applies action for the player being asked to act (if any), then runs
+    transitions until a player has to act or the table needs more players.
+    """
+
+    def step(self, action: ClientNextAction = None) -> StepResult:
+        if action is not None:
+            self.queue_action(self.player_to_act(), action)
+        for _ in range(MAX_TRANSITIONS_PER_STEP):
+            self.advance()
+            if self.seconds_until_input_needed() is not None:
+                return StepResult(self.table_info, self.player_to_act())
+        raise RuntimeError(
+            f"table {self.table_info.name} is stuck in {self.table_info.game_state}"
+        )
+
+    """ Runs one state transition. """
+
+    def advance(self):
+        table_info = self.table_info
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("%s: %s", table_info.name, table_info.game_state)
+            table_info.check_player_counts()
+        if (
+            table_info.game_state == GameState.GAME_NOT_STARTED
+        ):  # not used atm, but will after we add a Start Game button
+            # if table_info.get_num_active_players() >= 2:
+            table_info.game_state = GameState.BEFORE_HAND
+            # # set playerState to IN_HAND for all active players
+            # for player in table_info.players:
+            #     if player.state not in [
+            #         PlayerState.SITTING_OUT,
+            #         PlayerState.NOT_SEATED,
+            #     ]:
+            #         player.state = PlayerState.IN_HAND
+        elif table_info.game_state == GameState.BEFORE_HAND:
+            # reset state for new hand
+            table_info.new_hand_reset_state()
+            # TODO handle sit ins here so people can join in this state until we get to 2
+            # remove disconnected players for now, later we'd want to allow people to reconnect under the same name
+            for player in list(table_info.players):
+                if not player.is_connected:
+                    table_info.remove_player(player)
+            # TODO2 if someone has 0 stack, rebuy them for now
+            for player in table_info.players:
+                if player.stack == 0:
+                    player.buy_in(10_000)
+            # # set people's states to IN_HAND
+            # for player in table_info.players:
+            #     if player.state not in [
+            #         PlayerState.SITTING_OUT,
+            #         PlayerState.NOT_SEATED,
+            #     ]:
+            #         player.state = PlayerState.IN_HAND
+            if table_info.get_num_active_players() >= 2:
+                # move dealer, here because we need to wait to know who's in the hand to move the dealer
+                if table_info.dealer is None:
+                    table_info.dealer = table_info.get_first_seat_starting_at(
+                        0, PlayerState.IN_HAND
+                    )
+                else:
+                    table_info.dealer = table_info.get_next_seat(
+                        table_info.dealer, PlayerState.IN_HAND
+                    )
+                if self.on_hand_finished is not None:
+                    self.starting_stacks = {p.name: p.stack for p in table_info.players}
+                # force players to pay blinds, account for all-in,
+                #   initializes min bet bookeeping info also.
+                table_info.pay_blinds()
+                # deal hole cards to all active players
+                table_info.deal_hole_cards()
+                # always preflop, even if posting put players all in: whoever
+                # isn't still gets to call the blind, and PROCESS_ACTIONS
+                # collects the bets before going to showdown
+                table_info.game_state = GameState.PREFLOP
+        elif table_info.game_state == GameState.PROCESS_ACTIONS:
+            # process one person's action at a time
+            table_info.perform_next_player_action()
+
+            seat = table_info.get_next_seat_to_act()
+            if seat is None:
+                table_info.update_pots()
+                table_info.go_to_showdown_or_end_hand_else(
+                    table_info.process_actions_next_state
+                )
+                table_info.process_actions_next_state = None
+            else:
+                table_info.goToNextActionOnIfDone(seat)
+        elif table_info.game_state == GameState.PREFLOP:
+            # don't reset player bet bookkeeping info, blinds have been paid
+            # set action on
+            table_info.action_on = table_info.get_first_to_act_preflop()
+            # loop until everyone has acted
+            table_info.game_state = GameState.PROCESS_ACTIONS
+            table_info.process_actions_next_state = GameState.FLOP
+            # process_player_actions(table_info)
+            # # last thing, add bets to pot, create side pots
+            # table_info.update_pots()
+            # # go to showdown if everyone is all in, otherwise go to flop
+            # table_info.go_to_showdown_or_end_hand_else(GameState.FLOP)
+        elif table_info.game_state == GameState.FLOP:
+            # reset player bet bookkeeping info
+            table_info.new_street_reset_player_bet_info()
+            # deal flop cards
+            table_info.add_n_cards_to_board(3)
+            # set action on
+            table_info.action_on = table_info.get_first_to_act_postflop()
+            # loop until everyone has acted
+            table_info.game_state = GameState.PROCESS_ACTIONS
+            table_info.process_actions_next_state = GameState.TURN
+            # process_player_actions(table_info)
+            # last thing, add bets to pot, create side pots
+            # table_info.update_pots()
+            # go to showdown if everyone is all in, otherwise go to flop
+            # table_info.go_to_showdown_or_end_hand_else(GameState.TURN)
+        elif table_info.game_state == GameState.TURN:
+            # reset player bet bookkeeping info
+            table_info.new_street_reset_player_bet_info()
+            # deal turn card
+            table_info.add_n_cards_to_board(1)
+            # set action on
+            table_info.action_on = table_info.get_first_to_act_postflop()
+            # loop until everyone has acted
+            table_info.game_state = GameState.PROCESS_ACTIONS
+            table_info.process_actions_next_state = GameState.RIVER
+            # process_player_actions(table_info)
+            # last thing, add bets to pot, create side pots
+            # table_info.update_pots()
+            # go to showdown if everyone is all in, otherwise go to flop
+            # table_info.go_to_showdown_or_end_hand_else(GameState.RIVER)
+        elif table_info.game_state == GameState.RIVER:
+            # reset player bet bookkeeping info
+            table_info.new_street_reset_player_bet_info()
+            # deal river card
+            table_info.add_n_cards_to_board(1)
+            # set action on
+            table_info.action_on = table_info.get_first_to_act_postflop()
+            # loop until everyone has acted
+            table_info.game_state = GameState.PROCESS_ACTIONS
+            table_info.process_actions_next_state = GameState.SHOWDOWN
+            # process_player_actions(table_info)
+            # last thing, add bets to pot, create side pots
+            # table_info.update_pots()
+            # go to showdown if everyone is all in, otherwise go to flop
+            # table_info.go_to_showdown_or_end_hand_else(GameState.SHOWDOWN)
+        elif table_info.game_state == GameState.SHOWDOWN:
+            # flip players cards
+            table_info.show_eligible_players_cards()
+            self.equity_changed()
+            # TODO2 show remaining community cards one-by-one with timer between
+            table_info.game_state = GameState.SHOWDOWN_RUNOUT
+        elif table_info.game_state == GameState.SHOWDOWN_RUNOUT:
+            if len(table_info.community_cards) < 5:
+                table_info.add_n_cards_to_board(1)
+                self.equity_changed()
+            if len(table_info.community_cards) == 5:
+                table_info.game_state = GameState.END_HAND
+        elif table_info.game_state == GameState.END_HAND:
+            if self.on_hand_finished is not None:
+                pot = table_info.main_pot.pot_size + sum(
+                    side_pot.pot_size for side_pot in table_info.side_pots
+                )
+            # distributes pots to winners
+            table_info.distribute_pots_to_winners()
+            if self.on_hand_finished is not None:
+                self.on_hand_finished(self.hand_result(pot))
+            # handle sit outs/sit ins/disconnects (actually just do in start hand)
+            # set playerState to IN_HAND for all active players (maybe do this in before hand also)
+            # for player in table_info.players:
+            #     if player.state not in [
+            #         PlayerState.SITTING_OUT,
+            #         PlayerState.NOT_SEATED,
+            #     ]:
+            #         player.state = PlayerState.IN_HAND
+            table_info.hand_num += 1
+            table_info.action_num = 0
+            table_info.game_state = GameState.BEFORE_HAND
@@ -0,0 +1,115 @@
+"""
+All-in equity, run in a process pool so it never blocks the game loop.
+
+compute_equity enumerates every runout exactly when there are few enough
+(always on the flop and turn), otherwise it samples random runouts in
+batches until it has enough samples or runs out of time.
+"""
+
+import asyncio
+import itertools
+import math
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional
+
+import numpy as np
+
+from batch_evaluator import evaluate_batch
+
+# enumerate all runouts instead of sampling when there are at most this many
+EXACT_RUNOUT_LIMIT = 50_000
+SAMPLE_BATCH_SIZE = 5_000
+
+
+def _tally(hands: List[List[int]], board: List[int], runouts: np.ndarray):
+    # ranks[i][j] is player i's hand rank on runout j
+    num_runouts = len(runouts)
+    ranks = np.empty((len(hands), num_runouts), dtype=np.int32)
+    for i, hand in enumerate(hands):
+        known = np.broadcast_to(np.array(hand + board), (num_runouts, 2 + len(board)))
+        ranks[i] = evaluate_batch(np.concatenate([known, runouts], axis=1))
+    best = ranks == ranks.max(axis=0)
+    num_best = best.sum(axis=0)
+    wins = (best & (num_best == 1)).sum(axis=1)
+    ties = (best & (num_best > 1)).sum(axis=1)
+    return wins, ties
+
+
+"""
+Returns [{"win": w, "tie": t}, ...] aligned with hands, where w and t are the
+fraction of runouts each hand wins outright or splits.
+"""
+
+
+def compute_equity(
+    hands: List[List[int]],
+    board: List[int],
+    samples: int,
+    time_limit: float,
+    seed: Optional[int] = None,
+):
+    start_time = time.monotonic()
+    dead = set(board).union(*hands)
+    remaining = np.array([card for card in range(52) if card not in dead])
+    to_come = 5 - len(board)
+
+    wins = np.zeros(len(hands), dtype=np.int64)
+    ties = np.zeros(len(hands), dtype=np.int64)
+    if math.comb(len(remaining), to_come) <= EXACT_RUNOUT_LIMIT:
+        runouts = list(itertools.combinations(remaining, to_come))
+        runouts = np.array(runouts, dtype=np.intp).reshape(len(runouts), to_come)
+        wins, ties = _tally(hands, board, runouts)
+        total = len(runouts)
+    else:
+        rng = np.random.default_rng(seed)
+        total = 0
+        while total < samples:
+            batch_size = min(SAMPLE_BATCH_SIZE, samples - total)
+            # first to_come cards of a random permutation of the remaining cards
+            order = np.argpartition(
+                rng.random((batch_size, len(remaining))), to_come, axis=1
+            )
+            batch_wins, batch_ties = _tally(hands, board, remaining[order[:, :to_come]])
+            wins += batch_wins
+            ties += batch_ties
+            total += batch_size
+            if time.monotonic() - start_time > time_limit:
+                break
+    return [
+        {"win": float(w) / total, "tie": float(t) / total} for w, t in zip(wins, ties)
+    ]
+
+
+class EquityCalculator:
+    def __init__(self, samples=20_000, time_limit=0.5, deadline=2.0, max_workers=None):
+        self.samples = samples  # runouts sampled when not enumerating
+        self.time_limit = time_limit  # seconds a worker spends sampling
+        # seconds to wait on the pool (it may be busy) before giving up
+        self.deadline = deadline
+        # spawn, forking a process with running threads isn't safe
+        self.executor = ProcessPoolExecutor(
+            max_workers=max_workers, mp_context=multiprocessing.get_context("spawn")
+        )
+
+    async def calculate(self, hands: List[List[int]], board: List[int]):
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(
+            self.executor,
+            compute_equity,
+            hands,
+            board,
+            self.samples,
+            self.time_limit,
+        )
+        try:
+            return await asyncio.wait_for(future, self.deadline)
+        except asyncio.TimeoutError:
+            print("equity calculation missed its deadline")
+            return None
+
+    def shutdown(self):
+        # wait, running calculations are short, and a pool left to exit on its
+        # own can leave its processes behind when we are a worker ourselves
+        self.executor.shutdown(wait=True, cancel_futures=True)
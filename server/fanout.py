@@ -0,0 +1,239 @@
+"""
+Per-connection outboxes for table updates, so a slow client can't build up
+a backlog or hold up the rest of its table.
+
+Emits of OUTBOX_EVENTS go out to a room in one go (socket.io encodes them
+once and sends to everyone concurrently), except to connections that are
+still working through earlier messages. Those get the update in their
+outbox instead, which has one slot per event and is sent once the
+connection's send queue has drained. Updates that arrive in the meantime
+are coalesced into the slot: private views are replaced by the latest
+one, and public patches are chained into one patch (or applied to a
+pending snapshot). A client that's behind gets one up to date message
+instead of every update it missed.
+
+It's a socket.io client manager, so it also works under cluster.py's
+message bus managers, where it sends to the clients connected to this node.
+
+It's also where table updates are encoded for clients that asked for the
+binary wire format (see encode_wire), once per format for each emit.
+"""
+
+import asyncio
+import os
+import sys
+from typing import Dict, Tuple
+
+from socketio import AsyncManager
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from shared import apply_view_patch, encode_wire
+
+# seconds between checks on whether a connection that's behind has caught up
+OUTBOX_POLL_INTERVAL = 0.05
+
+"""
+Combines two public_table_info messages (see TableViewStore) into one that
+takes a client from where the first started to where the second ends. If
+they don't chain the latest one wins and the client resyncs off it.
+"""
+
+
+def coalesce_public_table_info(pending, message):
+    if "snapshot" in message and message["view_num"] >= pending["view_num"]:
+        return message
+    if "snapshot" in pending and pending["view_num"] >= message["view_num"]:
+        return pending
+    # a resync snapshot can be older than the patches waiting in the slot
+    older, newer = pending, message
+    if older["view_num"] > newer["view_num"]:
+        older, newer = newer, older
+    if newer["base_view_num"] != older["view_num"]:
+        return message
+    sent_at = max(pending["sent_at"], message["sent_at"])
+    if "snapshot" in older:
+        return {
+            "view_num": newer["view_num"],
+            "snapshot": apply_view_patch(older["snapshot"], newer["patch"]),
+            "sent_at": sent_at,
+        }
+    return {
+        "view_num": newer["view_num"],
+        "base_view_num": older["base_view_num"],
+        "patch": older["patch"] + newer["patch"],
+        "sent_at": sent_at,
+    }
+
+
+def latest(pending, message):
+    return message
+
+
+# events that go through outboxes, and how to combine two of them
+OUTBOX_EVENTS = {
+    "public_table_info": coalesce_public_table_info,
+    "private_table_info": latest,
+}
+
+
+class Outbox:
+    def __init__(self, sid, eio_sid, namespace, wire_format):
+        self.sid = sid
+        self.eio_sid = eio_sid
+        self.namespace = namespace
+        self.wire_format = wire_format
+        # event to the message waiting to be sent, in the order they arrived
+        self.pending: Dict[str, object] = {}
+        # sends pending once the connection catches up, None when it's empty
+        self.task: asyncio.Task = None
+        self.sent = 0
+        # messages folded into a later one instead of being sent
+        self.dropped = 0
+
+    def put(self, event, data):
+        if event in self.pending:
+            # moves to the back, so a private view still follows its public one
+            data = OUTBOX_EVENTS[event](self.pending.pop(event), data)
+            self.dropped += 1
+        self.pending[event] = data
+
+
+class OutboxManager(AsyncManager):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.outboxes: Dict[str, Outbox] = {}
+        # sid to the wire format it asked for when connecting, if not JSON
+        self.wire_formats: Dict[str, str] = {}
+
+    def set_wire_format(self, sid, wire_format):
+        if wire_format == "json":
+            self.wire_formats.pop(sid, None)
+        else:
+            self.wire_formats[sid] = wire_format
+
+    """ The message as it goes out in wire_format (one of WIRE_FORMATS). """
+
+    @staticmethod
+    def encode(data, wire_format):
+        return data if wire_format == "json" else encode_wire(data)
+
+    """
+    Connections that can be sent the same packets. engine.io caches a
+    packet's encoding for the transport it first goes out on, so binary
+    messages can't be shared between websocket and long-polling connections
+    (or one that's upgrading between them).
+    """
+
+    def get_send_group(self, outbox: Outbox):
+        if outbox.wire_format == "json":
+            return "json"
+        socket = self.server.eio.sockets.get(outbox.eio_sid)
+        if socket is not None and socket.upgraded:
+            return outbox.wire_format
+        return outbox.sid
+
+    """ Packets queued on the connection that it hasn't taken yet. """
+
+    def get_send_queue_size(self, eio_sid):
+        socket = self.server.eio.sockets.get(eio_sid)
+        return 0 if socket is None else socket.queue.qsize()
+
+    async def emit(
+        self, event, data, namespace, room=None, skip_sid=None, callback=None, **kwargs
+    ):
+        if event not in OUTBOX_EVENTS or callback is not None:
+            return await super().emit(
+                event,
+                data,
+                namespace,
+                room=room,
+                skip_sid=skip_sid,
+                callback=callback,
+                **kwargs,
+            )
+        if not isinstance(skip_sid, list):
+            skip_sid = [skip_sid]
+        skip_sid = list(skip_sid)
+        # send group to its wire format and the sids it goes out to right away
+        send_now: Dict[str, Tuple[str, list]] = {}
+        for sid, eio_sid in list(self.get_participants(namespace, room)):
+            if sid in skip_sid:
+                continue
+            outbox = self.outboxes.get(sid)
+            if outbox is None:
+                outbox = self.outboxes[sid] = Outbox(
+                    sid, eio_sid, namespace, self.wire_formats.get(sid, "json")
+                )
+            if outbox.pending or self.get_send_queue_size(eio_sid) > 0:
+                # behind, this one waits in the outbox
+                outbox.put(event, data)
+                skip_sid.append(sid)
+                if outbox.task is None:
+                    outbox.task = asyncio.create_task(self.send_outbox(outbox))
+            else:
+                outbox.sent += 1
+                group = self.get_send_group(outbox)
+                send_now.setdefault(group, (outbox.wire_format, []))[1].append(sid)
+        encoded = {}
+        for group, (wire_format, sids) in send_now.items():
+            if wire_format not in encoded:
+                encoded[wire_format] = self.encode(data, wire_format)
+            group_room, group_skip_sid = room, skip_sid
+            if len(send_now) > 1:
+                if len(sids) == 1:
+                    group_room, group_skip_sid = sids[0], None
+                else:
+                    # everyone else in the room gets another group's emit
+                    group_skip_sid = skip_sid + [
+                        sid
+                        for other_group, (_, other_sids) in send_now.items()
+                        if other_group != group
+                        for sid in other_sids
+                    ]
+            await super().emit(
+                event,
+                encoded[wire_format],
+                namespace,
+                room=group_room,
+                skip_sid=group_skip_sid,
+                **kwargs,
+            )
+
+    async def send_outbox(self, outbox: Outbox):
+        while outbox.pending:
+            if self.get_send_queue_size(outbox.eio_sid) > 0:
+                await asyncio.sleep(OUTBOX_POLL_INTERVAL)
+                continue
+            messages, outbox.pending = outbox.pending, {}
+            for event, data in messages.items():
+                # this class's emit would put it back in the outbox
+                await AsyncManager.emit(
+                    self,
+                    event,
+                    self.encode(data, outbox.wire_format),
+                    outbox.namespace,
+                    room=outbox.sid,
+                )
+                outbox.sent += 1
+        outbox.task = None
+
+    def basic_disconnect(self, sid, namespace, **kwargs):
+        self.wire_formats.pop(sid, None)
+        outbox = self.outboxes.pop(sid, None)
+        if outbox is not None and outbox.task is not None:
+            outbox.task.cancel()
+        return super().basic_disconnect(sid, namespace, **kwargs)
+
+    """ Queue depth and dropped updates of every connection, for the outbox_stats event. """
+
+    def get_outbox_stats(self):
+        return [
+            {
+                "sid": outbox.sid,
+                "depth": len(outbox.pending),
+                "send_queue": self.get_send_queue_size(outbox.eio_sid),
+                "sent": outbox.sent,
+                "dropped": outbox.dropped,
+            }
+            for outbox in self.outboxes.values()
+        ]
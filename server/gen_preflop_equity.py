@@ -0,0 +1,83 @@
+"""
+Generates preflop_equity.bin, the heads-up equity of every starting hand
+class against every other (see preflop_equity.py for the layout).
+
+By suit isomorphism any one combo of the hero's class has the same equity
+against a villain class as the class average, so only the villain combo and
+the board are sampled. Rerun after changing the evaluator, e.g.
+    python3 gen_preflop_equity.py --samples 20000
+"""
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from batch_evaluator import evaluate_batch
+from preflop_equity import NUM_CLASSES, DEFAULT_PATH, class_combos, write_table
+
+
+def matchup_equity(hero_class, villain_class, samples, rng):
+    hero = np.array(class_combos(hero_class)[0])
+    villains = np.array(
+        [c for c in class_combos(villain_class) if not set(c) & set(hero.tolist())]
+    )
+    villain = villains[rng.integers(len(villains), size=samples)]
+    # 5 random cards per sample, never one of the 4 hole cards
+    keys = rng.random((samples, 52))
+    keys[:, hero] = 2
+    np.put_along_axis(keys, villain, 2, axis=1)
+    board = np.argpartition(keys, 5, axis=1)[:, :5]
+
+    hero_ranks = evaluate_batch(
+        np.concatenate([np.broadcast_to(hero, (samples, 2)), board], axis=1)
+    )
+    villain_ranks = evaluate_batch(np.concatenate([villain, board], axis=1))
+    return (
+        float((hero_ranks > villain_ranks).mean()),
+        float((hero_ranks == villain_ranks).mean()),
+    )
+
+
+def hero_row(hero_class, samples, seed):
+    # only villains >= hero, the rest are filled in by symmetry
+    rng = np.random.default_rng([seed, hero_class])
+    return [
+        matchup_equity(hero_class, villain_class, samples, rng)
+        for villain_class in range(hero_class, NUM_CLASSES)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--samples", type=int, default=20_000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--output", default=DEFAULT_PATH)
+    args = parser.parse_args()
+
+    start_time = time.time()
+    equities = [[None] * NUM_CLASSES for _ in range(NUM_CLASSES)]
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        rows = executor.map(
+            hero_row,
+            range(NUM_CLASSES),
+            [args.samples] * NUM_CLASSES,
+            [args.seed] * NUM_CLASSES,
+        )
+        for hero_class, row in enumerate(rows):
+            for villain_class, (win, tie) in enumerate(row, start=hero_class):
+                equities[hero_class][villain_class] = (win, tie)
+                if villain_class != hero_class:
+                    equities[villain_class][hero_class] = (max(0.0, 1 - win - tie), tie)
+            print(f"class {hero_class + 1}/{NUM_CLASSES} done")
+    write_table(args.output, equities)
+    print(f"wrote {args.output} in {time.time() - start_time:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,418 @@
+"""
+Load test: hundreds of headless socket.io clients playing against a local
+server.py, to find how many tables and players one server sustains.
+
+Every client sits at one of the --tables tables the harness creates and
+answers its prompts with random legal actions, so the tables play like
+real ones (pacing delays included). At the end it reports
+    fan-out: server broadcast to each client receiving it
+    ack: action emitted to the server acknowledging it
+    update: action emitted to the next table update arriving
+as percentiles, plus the CPU used by the server (with its worker and
+equity processes) and by the harness itself. On a shared machine a busy
+harness slows the server down too, so watch its CPU.
+
+With --laggy N, N of the clients take --lag seconds to handle each update,
+like players on a bad connection. Their updates should be coalesced by
+the server's outboxes (see fanout.py) without slowing anyone else down,
+and they're left out of the latency percentiles.
+
+    python3 loadtest.py --tables 50 --players 6 --duration 60 --spawn
+    python3 loadtest.py --spawn --server-args "--workers 4"
+    python3 loadtest.py --spawn --laggy 10 --lag 2
+    python3 loadtest.py --spawn --wire-format json
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import shlex
+import signal
+import subprocess
+import sys
+import time
+from typing import Dict, List
+
+import socketio
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from shared import TableViewStore, BINARY_WIRE_FORMAT, WIRE_FORMATS, decode_wire
+
+# new connections per second, so the server isn't hit with all of them at once
+CONNECT_RATE = 50
+ACK_TIMEOUT = 10
+SERVER_START_TIMEOUT = 30
+CLOCK_TICKS = os.sysconf("SC_CLK_TCK")
+
+
+def percentiles(samples: List[float]):
+    if not samples:
+        return "no samples"
+    samples = sorted(samples)
+
+    def at(fraction):
+        return samples[min(len(samples) - 1, int(fraction * len(samples)))] * 1000
+
+    return (
+        f"p50 {at(0.5):7.1f}ms  p90 {at(0.9):7.1f}ms  p99 {at(0.99):7.1f}ms"
+        f"  max {samples[-1] * 1000:7.1f}ms  ({len(samples):,} samples)"
+    )
+
+
+""" CPU seconds used so far by a process and everything it started. """
+
+
+def process_tree_cpu_seconds(root_pid) -> float:
+    stats = {}
+    for name in os.listdir("/proc"):
+        if not name.isdigit():
+            continue
+        try:
+            with open(f"/proc/{name}/stat") as f:
+                # the command name can hold spaces, the fields after it can't
+                fields = f.read().rpartition(")")[2].split()
+        except OSError:
+            continue
+        # ppid, utime, stime, see proc(5)
+        stats[int(name)] = (int(fields[1]), int(fields[11]) + int(fields[12]))
+    children: Dict[int, List[int]] = {}
+    for pid, (ppid, _) in stats.items():
+        children.setdefault(ppid, []).append(pid)
+    total, stack = 0, [root_pid]
+    while stack:
+        pid = stack.pop()
+        if pid in stats:
+            total += stats[pid][1]
+        stack.extend(children.get(pid, []))
+    return total / CLOCK_TICKS
+
+
+class LoadStats:
+    def __init__(self):
+        self.recording = False
+        self.fan_out: List[float] = []
+        self.ack: List[float] = []
+        self.update: List[float] = []
+        self.updates = 0
+        self.actions = 0
+        self.ack_timeouts = 0
+        self.resyncs = 0
+        self.refused = 0
+        self.disconnects = 0
+        # size of the binary table updates received
+        self.wire_bytes = 0
+        self.hands_by_table: Dict[str, List[int]] = {}
+
+    def saw_hand(self, table_name, hand_num):
+        hands = self.hands_by_table.setdefault(table_name, [hand_num, hand_num])
+        hands[1] = max(hands[1], hand_num)
+
+    def hands_played(self):
+        return sum(last - first for first, last in self.hands_by_table.values())
+
+
+class LoadClient:
+    def __init__(
+        self, ind, url, table_name, stats: LoadStats, lag=0, wire_format="json"
+    ):
+        self.url = url
+        self.table_name = table_name
+        self.wire_format = wire_format
+        self.stats = stats
+        # seconds to sit on each update before acknowledging it
+        self.lag = lag
+        self.rng = random.Random(ind)
+        self.sio = socketio.AsyncClient(reconnection=False)
+        self.sio.on("public_table_info", self.on_public_table_info)
+        self.sio.on("private_table_info", self.on_private_table_info)
+        self.sio.on("disconnect", self.on_disconnect)
+        self.table_view_store = TableViewStore()
+        self.private_view = None
+        # prompt we already answered
+        self.answered = None
+        self.action_sent_at = None
+
+    async def connect(self):
+        try:
+            await self.sio.connect(
+                self.url,
+                auth={"table": self.table_name, "wire_format": self.wire_format},
+                # long-polling, so a slow client stops asking for messages
+                transports=["polling"] if self.lag else None,
+            )
+        except socketio.exceptions.ConnectionError:
+            self.stats.refused += 1
+
+    def on_disconnect(self):
+        if self.stats.recording:
+            self.stats.disconnects += 1
+
+    async def on_public_table_info(self, data):
+        now = time.time()
+        if isinstance(data, bytes):
+            if self.stats.recording:
+                self.stats.wire_bytes += len(data)
+            data = decode_wire(data)
+        store = self.table_view_store
+        stats = self.stats
+        if store.receive(data) and self.sio.connected:
+            await self.sio.emit("resync_table_view")
+            if stats.recording:
+                stats.resyncs += 1
+        if stats.recording:
+            stats.updates += 1
+            if not self.lag:
+                stats.fan_out.append(now - data["sent_at"])
+                if self.action_sent_at is not None:
+                    stats.update.append(now - self.action_sent_at)
+            if store.view is not None:
+                stats.saw_hand(store.view["name"], store.view["hand_num"])
+        self.action_sent_at = None
+        self.answer_prompt()
+        await asyncio.sleep(self.lag)
+
+    async def on_private_table_info(self, data):
+        if isinstance(data, bytes):
+            if self.stats.recording:
+                self.stats.wire_bytes += len(data)
+            data = decode_wire(data)
+        self.private_view = data
+        self.answer_prompt()
+        await asyncio.sleep(self.lag)
+
+    # once we have both halves of a view, whichever came first
+    def answer_prompt(self):
+        store, data = self.table_view_store, self.private_view
+        if data is None or store.view_num != data["view_num"]:
+            return
+        public_view = store.view
+        if data["client_player_action"] is None:
+            return
+        for player in public_view["players"]:
+            if player["name"] == data["name"]:
+                # acting doesn't wait on the lag, only acknowledging updates does
+                asyncio.create_task(
+                    self.act(
+                        player,
+                        data["client_player_action"],
+                        len(public_view["community_cards"]),
+                    )
+                )
+
+    async def act(self, player, action, num_board_cards):
+        # action_num carries over into the next street, so the board tells
+        # a new prompt apart from one we already answered
+        prompt = (action["hand_num"], action["action_num"], num_board_cards)
+        if prompt == self.answered:
+            return
+        self.answered = prompt
+        data = {"hand_num": action["hand_num"], "action_num": action["action_num"]}
+        r = self.rng.random()
+        if r < 0.1 and not action["can_check"]:
+            event = "player_folded"
+        elif action["can_check"] and r < 0.8:
+            event = "player_checked"
+        elif action["can_raise"] and r >= 0.8:
+            event = "player_bet"
+            data["bet_amount"] = min(
+                action["min_raise"], player["stack"] + player["current_bet"]
+            )
+        elif action["can_call"]:
+            event = "player_called"
+        else:
+            event = "player_checked"
+        sent_at = time.time()
+        self.action_sent_at = sent_at
+        try:
+            await self.sio.call(event, data, timeout=ACK_TIMEOUT)
+        except socketio.exceptions.TimeoutError:
+            self.stats.ack_timeouts += 1
+            return
+        except socketio.exceptions.BadNamespaceError:
+            # disconnected while we were deciding
+            return
+        if self.stats.recording:
+            self.stats.actions += 1
+            if not self.lag:
+                self.stats.ack.append(time.time() - sent_at)
+
+    async def disconnect(self):
+        if self.sio.connected:
+            await self.sio.disconnect()
+
+
+async def wait_for_server(host, port, process):
+    deadline = time.monotonic() + SERVER_START_TIMEOUT
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            sys.exit(f"server exited with {process.returncode}")
+        try:
+            _, writer = await asyncio.open_connection(host, port)
+        except OSError:
+            await asyncio.sleep(0.5)
+            continue
+        writer.close()
+        return
+    sys.exit(f"server on {host}:{port} didn't come up")
+
+
+""" Outbox stats of every connection to the server, see fanout.py. """
+
+
+async def get_outbox_stats(url):
+    admin = socketio.AsyncClient(reconnection=False)
+    # joins the default table, not one of ours
+    await admin.connect(url)
+    outbox_stats = await admin.call("outbox_stats")
+    await admin.disconnect()
+    return outbox_stats
+
+
+async def create_tables(url, table_names, num_seats):
+    # the admin connection sits at the default table while it works
+    admin = socketio.AsyncClient(reconnection=False)
+    await admin.connect(url)
+    for name in table_names:
+        result = await admin.call(
+            "create_table", {"name": name, "num_seats": num_seats}
+        )
+        if "error" in result:
+            sys.exit(f"couldn't create table {name}: {result['error']}")
+    await admin.disconnect()
+
+
+def print_report(
+    stats: LoadStats, clients, elapsed, server_cpu, harness_cpu, outbox_stats
+):
+    print(f"\n{len(clients)} clients at {len(stats.hands_by_table)} tables")
+    print(f"  refused connections {stats.refused}, dropped {stats.disconnects}")
+    print(
+        f"  {stats.hands_played():,} hands,"
+        f" {stats.updates / elapsed:,.0f} updates/sec,"
+        f" {stats.actions / elapsed:,.1f} actions/sec,"
+        f" {stats.ack_timeouts} ack timeouts, {stats.resyncs} resyncs"
+    )
+    print(f"  fan-out  {percentiles(stats.fan_out)}")
+    print(f"  ack      {percentiles(stats.ack)}")
+    print(f"  update   {percentiles(stats.update)}")
+    if stats.wire_bytes:
+        print(f"  binary updates {stats.wire_bytes / elapsed / 1024:,.1f} KiB/sec")
+    if outbox_stats:
+        sent = sum(outbox["sent"] for outbox in outbox_stats)
+        dropped = sum(outbox["dropped"] for outbox in outbox_stats)
+        print(
+            f"  outboxes {sent:,} sent, {dropped:,} coalesced,"
+            f" max depth {max(outbox['depth'] for outbox in outbox_stats)},"
+            f" max send queue {max(outbox['send_queue'] for outbox in outbox_stats)}"
+        )
+    if server_cpu is not None:
+        print(f"  server CPU  {server_cpu / elapsed:6.1%} of a core")
+    print(f"  harness CPU {harness_cpu / elapsed:6.1%} of a core")
+
+
+async def run(args):
+    url = f"http://{args.host}:{args.port}"
+    server_process = None
+    if args.spawn:
+        server_dir = os.path.dirname(os.path.abspath(__file__))
+        server_path = os.path.join(server_dir, "server.py")
+        server_process = subprocess.Popen(
+            [sys.executable, server_path, "--port", str(args.port)]
+            + shlex.split(args.server_args),
+            cwd=server_dir,
+            # the server prints its game state on every transition, which would
+            # swamp the report
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+    server_pid = server_process.pid if server_process is not None else args.server_pid
+    try:
+        await wait_for_server(args.host, args.port, server_process)
+        table_names = [f"load {ind}" for ind in range(args.tables)]
+        await create_tables(url, table_names, args.players)
+
+        stats = LoadStats()
+        clients = [
+            LoadClient(
+                ind,
+                url,
+                table_names[ind % args.tables],
+                stats,
+                lag=args.lag if ind < args.laggy else 0,
+                wire_format=args.wire_format,
+            )
+            for ind in range(args.tables * args.players)
+        ]
+        print(f"connecting {len(clients)} clients")
+        for ind, client in enumerate(clients):
+            asyncio.create_task(client.connect())
+            if ind % CONNECT_RATE == CONNECT_RATE - 1:
+                await asyncio.sleep(1)
+        await asyncio.sleep(args.warmup)
+
+        print(f"measuring for {args.duration}s")
+        stats.recording = True
+        start_time = time.monotonic()
+        start_harness_cpu = time.process_time()
+        if server_pid is not None:
+            start_server_cpu = process_tree_cpu_seconds(server_pid)
+        await asyncio.sleep(args.duration)
+        elapsed = time.monotonic() - start_time
+        stats.recording = False
+        harness_cpu = time.process_time() - start_harness_cpu
+        server_cpu = None
+        if server_pid is not None:
+            server_cpu = process_tree_cpu_seconds(server_pid) - start_server_cpu
+        outbox_stats = await get_outbox_stats(url)
+        print_report(stats, clients, elapsed, server_cpu, harness_cpu, outbox_stats)
+
+        await asyncio.gather(*[client.disconnect() for client in clients])
+    finally:
+        if server_process is not None:
+            server_process.send_signal(signal.SIGINT)
+            try:
+                server_process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                server_process.kill()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--tables", type=int, default=20)
+    parser.add_argument("--players", type=int, default=6, help="per table")
+    parser.add_argument("--duration", type=float, default=30, help="seconds")
+    parser.add_argument(
+        "--warmup", type=float, default=5, help="seconds after connecting"
+    )
+    parser.add_argument(
+        "--laggy", type=int, default=0, help="clients slow to take updates"
+    )
+    parser.add_argument(
+        "--lag", type=float, default=2, help="seconds a laggy client takes"
+    )
+    parser.add_argument(
+        "--wire-format",
+        choices=WIRE_FORMATS,
+        default=BINARY_WIRE_FORMAT,
+        help="format the clients ask for table updates in",
+    )
+    parser.add_argument(
+        "--spawn", action="store_true", help="start server.py on --port for the run"
+    )
+    parser.add_argument(
+        "--server-args", default="", help="extra server.py arguments with --spawn"
+    )
+    parser.add_argument(
+        "--server-pid",
+        type=int,
+        help="measure CPU of an already running server",
+    )
+    args = parser.parse_args()
+    if not 2 <= args.players <= 10:
+        parser.error("tables seat 2 to 10 players")
+    asyncio.run(run(args))
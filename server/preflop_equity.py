@@ -0,0 +1,93 @@
+"""
+Heads-up preflop equity for the 169 starting hand classes, read from a
+binary file generated by gen_preflop_equity.py and memory-mapped at start.
+
+Classes are indexed on a 13x13 grid: pairs are r * 13 + r, suited hands
+high * 13 + low and offsuit hands low * 13 + high (ranks 0-12, 12 is Ace).
+
+File layout (little endian): the 4 byte magic, then a uint16 table size
+(169), then for every (hero class, villain class) a uint16 win and a uint16
+tie fraction scaled by EQUITY_SCALE. A class matchup is the average over
+every non-conflicting pair of combos, so specific suit interactions (e.g.
+AsKs vs QsQh) are only approximated.
+"""
+
+import mmap
+import os
+import struct
+
+MAGIC = b"PFEQ"
+NUM_CLASSES = 169
+EQUITY_SCALE = 65535
+_HEADER = struct.Struct("<4sH")
+_ENTRY = struct.Struct("<HH")
+
+DEFAULT_PATH = os.path.join(os.path.dirname(__file__), "preflop_equity.bin")
+
+
+def hand_class(card1: int, card2: int) -> int:
+    rank1, rank2 = card1 % 13, card2 % 13
+    high, low = max(rank1, rank2), min(rank1, rank2)
+    if card1 // 13 == card2 // 13:
+        return high * 13 + low
+    return low * 13 + high
+
+
+def class_combos(hand_class_ind: int):
+    # every 2 card combo in a class, cards are ints 0-51
+    row, col = divmod(hand_class_ind, 13)
+    combos = []
+    for suit1 in range(4):
+        for suit2 in range(4):
+            card1, card2 = suit1 * 13 + row, suit2 * 13 + col
+            if row == col and suit1 < suit2:
+                combos.append((card1, card2))
+            elif row > col and suit1 == suit2:
+                combos.append((card1, card2))
+            elif row < col and suit1 != suit2:
+                combos.append((card1, card2))
+    return combos
+
+
+def write_table(path, equities):
+    # equities[hero][villain] is (win, tie), fractions of 1
+    with open(path, "wb") as f:
+        f.write(_HEADER.pack(MAGIC, NUM_CLASSES))
+        for hero in range(NUM_CLASSES):
+            for villain in range(NUM_CLASSES):
+                win, tie = equities[hero][villain]
+                f.write(
+                    _ENTRY.pack(round(win * EQUITY_SCALE), round(tie * EQUITY_SCALE))
+                )
+
+
+class PreflopEquityTable:
+    def __init__(self, path=DEFAULT_PATH):
+        with open(path, "rb") as f:
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, num_classes = _HEADER.unpack_from(self.mm, 0)
+        expected_size = _HEADER.size + num_classes * num_classes * _ENTRY.size
+        if magic != MAGIC or num_classes != NUM_CLASSES or len(self.mm) != expected_size:
+            self.mm.close()
+            raise ValueError(f"{path} is not a preflop equity table")
+
+    def lookup(self, hero_hole_cards, villain_hole_cards):
+        hero = hand_class(*hero_hole_cards)
+        villain = hand_class(*villain_hole_cards)
+        win, tie = _ENTRY.unpack_from(
+            self.mm, _HEADER.size + (hero * NUM_CLASSES + villain) * _ENTRY.size
+        )
+        return {"win": win / EQUITY_SCALE, "tie": tie / EQUITY_SCALE}
+
+    def close(self):
+        self.mm.close()
+
+
+""" Returns None if the table hasn't been generated, so callers can fall back to simulating. """
+
+
+def load_preflop_equity_table(path=DEFAULT_PATH):
+    if not os.path.exists(path):
+        print(f"no preflop equity table at {path}, run gen_preflop_equity.py")
+        return None
+    return PreflopEquityTable(path)
@@ -0,0 +1,89 @@
+"""
+Replays a trace recorded with `server.py --record-trace PATH` as fast as
+possible, feeding every input to every table through the same engine as
+the live server, with the recorded deck seeds and timestamps. Useful for
+profiling a real session and bisecting regressions:
+    python3 replay.py session.jsonl --profile replay.prof
+"""
+
+import argparse
+import cProfile
+import logging
+import os
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from shared import TableInfo, SeededDecks
+import server
+from session_trace import read_trace
+from engine import Engine
+
+
+""" Returns every table the trace created, by name, closed tables included. """
+
+
+def replay(events):
+    engines = {}
+    now = 0.0
+    for event in events:
+        now = event["t"]
+        name, sid, data = event["event"], event["sid"], event["data"]
+        if name == "create_table":
+            table_info = TableInfo(**data["config"])
+            table_info.deck_pool = SeededDecks(data["seed"])
+            engines[table_info.name] = Engine(table_info, clock=lambda: now)
+            continue
+        engine = engines[event["table"]]
+        table_info = engine.table_info
+        if name == "close_table":
+            # nothing else arrives for it, keep it for the summary
+            continue
+        if name == "tick":
+            engine.advance()
+        elif name == "connect":
+            server.seat_new_player(table_info, sid, data["name"], data["seat"])
+        elif name == "disconnect":
+            server.mark_player_disconnected(table_info, sid)
+        elif name in server.PLAYER_ACTION_EVENTS:
+            server.queue_player_action(
+                engine, sid, server.PLAYER_ACTION_EVENTS[name], data
+            )
+        else:
+            raise ValueError(f"unknown trace event {name}")
+    return {name: engine.table_info for name, engine in engines.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("trace")
+    parser.add_argument("--profile", metavar="PATH", help="write cProfile stats")
+    parser.add_argument("--verbose", action="store_true", help="log every transition")
+    args = parser.parse_args()
+    if args.verbose:
+        logging.basicConfig(level=logging.DEBUG)
+
+    # read_trace checks the header's version, nothing else in it is needed
+    _, events = read_trace(args.trace)
+    num_ticks = sum(1 for event in events if event["event"] == "tick")
+    profiler = cProfile.Profile() if args.profile else None
+    start_time = time.perf_counter()
+    if profiler is not None:
+        profiler.enable()
+    tables = replay(events)
+    if profiler is not None:
+        profiler.disable()
+        profiler.dump_stats(args.profile)
+    elapsed = time.perf_counter() - start_time
+
+    print(f"replayed {len(events)} events ({num_ticks} ticks) in {elapsed:.3f}s")
+    num_hands = sum(table_info.hand_num - 1 for table_info in tables.values())
+    print(f"{num_ticks / elapsed:,.0f} ticks/sec, {num_hands} hands")
+    for name, table_info in tables.items():
+        print(f"{name} final stacks: {[(p.name, p.stack) for p in table_info.players]}")
+
+
+if __name__ == "__main__":
+    main()
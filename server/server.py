@@ -2,8 +2,9 @@ import sys
 import os
 from typing import List
 import random
-
-# import time
+import argparse
+import time
+import urllib.parse
 
 import asyncio
 import socketio
@@ -13,7 +14,6 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 from shared import (
     TableInfo,
     GameState,
-    PlayerState,
     ClientPlayerState,
     ClientPlayerAction,
     ClientNextAction,
@@ -22,36 +22,112 @@ from shared import (
     Pot,
     Deck,
     Card,
+    SeededDecks,
+    diff_view,
+    WIRE_FORMATS,
+    POT_ELIGIBLE_PLAYER_STATES,
+)
+from equity import EquityCalculator
+from preflop_equity import PreflopEquityTable, load_preflop_equity_table
+from session_trace import TraceRecorder
+from engine import Engine
+from table_registry import TableRegistry, TableEntry
+from workers import ShardedTables
+from fanout import OutboxManager
+from cluster import (
+    HashRing,
+    NodeTables,
+    make_client_manager,
+    start_broker,
+    use_client_manager,
 )
 
-sio = socketio.AsyncServer(async_mode="asgi")
+sio = socketio.AsyncServer(async_mode="asgi", client_manager=OutboxManager())
 app = socketio.ASGIApp(sio)
 
 address = "0.0.0.0"
 port = 8000
 
 
+"""
+Inputs are applied through these helpers so replay.py can feed a recorded
+trace through exactly the same code as the live socket handlers.
+"""
+
+
+def seat_new_player(table_info: TableInfo, sid, name, seat):
+    table_info.add_player(name=name, seat=seat, sio_id=sid)
+
+
+def mark_player_disconnected(table_info: TableInfo, sid):
+    p = table_info.get_player_by_sio_id(sid)
+    if p is not None:
+        p.is_connected = False
+        # player will get set to sitting out at the end of the round (or if they take long enough to act)
+
+
+def queue_player_action(engine: Engine, sid, action, data):
+    p = engine.table_info.get_player_by_sio_id(sid)
+    if p is not None and p.client_player_action is not None:
+        # ignore actions meant for an earlier decision
+        if (
+            p.client_player_action.hand_num == data["hand_num"]
+            and p.client_player_action.action_num == data["action_num"]
+        ):
+            engine.queue_action(
+                p, ClientNextAction(action=action, bet_amount=data.get("bet_amount"))
+            )
+
+
+def record_event(event, table_name, sid=None, data=None):
+    if trace_recorder is not None:
+        trace_recorder.record(event, table_name, sid, data)
+
+
+""" The socket.io room every player at a table is in. """
+
+
+def table_room(table_name):
+    return "table:" + table_name
+
+
+def requested_table_name(environ, auth):
+    # clients pick a table with auth={"table": name} or ?table=name
+    if isinstance(auth, dict) and auth.get("table"):
+        return auth["table"]
+    query = urllib.parse.parse_qs(environ.get("QUERY_STRING", ""))
+    if query.get("table"):
+        return query["table"][0]
+    return TABLE_NAME
+
+
+def requested_wire_format(auth):
+    # clients ask for table updates in binary with auth={"wire_format": ...},
+    # anything we don't know (like a newer format) gets JSON
+    if isinstance(auth, dict) and auth.get("wire_format") in WIRE_FORMATS:
+        return auth["wire_format"]
+    return "json"
+
+
 @sio.event
 async def connect(sid, environ, auth):
     print("connect ", sid)
+    # before joining, the table can send its first snapshot before join_table returns
+    sio.manager.set_wire_format(sid, requested_wire_format(auth))
     # TODO2 this will happen after the game creation screen
-    if table_info is not None:
-        open_seats = table_info.get_open_seats()
-        table_info.add_player(
-            name="Player " + str(random.randint(1, 999)),
-            seat=random.choice(open_seats),
-            sio_id=sid,
-        )
+    table_name = requested_table_name(environ, auth)
+    error = await tables.join_table(table_name, sid)
+    if error is not None:
+        # this sid never finishes connecting, so nothing cleans it up later
+        sio.manager.set_wire_format(sid, "json")
+        raise socketio.exceptions.ConnectionRefusedError(error)
+    await sio.enter_room(sid, table_room(table_name))
 
 
 @sio.event
 async def disconnect(sid):
     print("disconnect ", sid)
-    if table_info is not None:
-        p = table_info.get_player_by_sio_id(sid)
-        if p is not None:
-            p.is_connected = False
-            # player will get set to sitting out at the end of the round (or if they take long enough to act)
+    await tables.leave_table(sid)
 
 
 @sio.on("my_event")
@@ -59,61 +135,94 @@ async def on_my_event(sid, data):
     print("got my_event " + str(data["data"]))
 
 
+async def on_player_action(sid, event, data):
+    print(f"got {event} event {data}\n\n\n")
+    await tables.player_action(sid, event, data)
+
+
 @sio.on("player_bet")
 async def on_player_bet(sid, data):
-    print(f"got player_bet event {data}\n\n\n")
-    p = table_info.get_player_by_sio_id(sid)
-    if p is not None and p.client_player_action is not None:
-        if (
-            p.client_player_action.hand_num == data["hand_num"]
-            and p.client_player_action.action_num == data["action_num"]
-        ):
-            p.client_player_action.next_action = ClientNextAction(
-                action=ClientNextActionType.BET,
-                bet_amount=data["bet_amount"],
-            )
+    await on_player_action(sid, "player_bet", data)
 
 
 @sio.on("player_checked")
 async def on_player_checked(sid, data):
-    print(f"got player checked event {data}\n\n\n")
-    p = table_info.get_player_by_sio_id(sid)
-    if p is not None and p.client_player_action is not None:
-        if (
-            p.client_player_action.hand_num == data["hand_num"]
-            and p.client_player_action.action_num == data["action_num"]
-        ):
-            p.client_player_action.next_action = ClientNextAction(
-                action=ClientNextActionType.CHECK,
-            )
+    await on_player_action(sid, "player_checked", data)
 
 
 @sio.on("player_called")
 async def on_player_called(sid, data):
-    print(f"got player called event {data}\n\n\n")
-    p = table_info.get_player_by_sio_id(sid)
-    if p is not None and p.client_player_action is not None:
-        if (
-            p.client_player_action.hand_num == data["hand_num"]
-            and p.client_player_action.action_num == data["action_num"]
-        ):
-            p.client_player_action.next_action = ClientNextAction(
-                action=ClientNextActionType.CALL,
-            )
+    await on_player_action(sid, "player_called", data)
 
 
 @sio.on("player_folded")
-async def on_player_called(sid, data):
-    print(f"got player folded event {data}\n\n\n")
-    p = table_info.get_player_by_sio_id(sid)
-    if p is not None and p.client_player_action is not None:
-        if (
-            p.client_player_action.hand_num == data["hand_num"]
-            and p.client_player_action.action_num == data["action_num"]
-        ):
-            p.client_player_action.next_action = ClientNextAction(
-                action=ClientNextActionType.FOLD,
-            )
+async def on_player_folded(sid, data):
+    await on_player_action(sid, "player_folded", data)
+
+
+""" Clients ask for a snapshot of their table's view when they miss a patch. """
+
+
+@sio.on("resync_table_view")
+async def on_resync_table_view(sid, data=None):
+    snapshot = await tables.resync_table_view(sid)
+    if snapshot is not None:
+        await sio.emit("public_table_info", snapshot, room=sid)
+
+
+""" Table management, the return value is sent back as the event's ack. """
+
+
+@sio.on("list_tables")
+async def on_list_tables(sid, data=None):
+    return await tables.list_tables()
+
+
+@sio.on("outbox_stats")
+async def on_outbox_stats(sid, data=None):
+    # queue depth and dropped updates of every connection to this node
+    return sio.manager.get_outbox_stats()
+
+
+@sio.on("create_table")
+async def on_create_table(sid, data):
+    # TODO2 no accounts yet, so anyone can create or close a table
+    try:
+        table_config = {
+            "name": str(data["name"]),
+            "num_seats": int(data.get("num_seats", NUM_SEATS)),
+            "sm_blind": int(data.get("sm_blind", SM_BLIND)),
+            "bg_blind": int(data.get("bg_blind", BG_BLIND)),
+        }
+    except (KeyError, TypeError, ValueError):
+        return {"error": "bad table config"}
+    if not 2 <= table_config["num_seats"] <= MAX_SEATS:
+        return {"error": f"tables seat 2 to {MAX_SEATS} players"}
+    error = await tables.create_table(table_config)
+    if error is not None:
+        return {"error": error}
+    return {"name": table_config["name"]}
+
+
+@sio.on("close_table")
+async def on_close_table(sid, data):
+    name = data.get("name") if isinstance(data, dict) else None
+    sids = await tables.close_table(name)
+    if sids is None:
+        return {"error": f"no table named {name}"}
+    for table_sid in sids:
+        await sio.disconnect(table_sid)
+    await sio.close_room(table_room(name))
+    return {"name": name}
+
+
+# inbound events replay.py knows how to apply, and the action each queues
+PLAYER_ACTION_EVENTS = {
+    "player_bet": ClientNextActionType.BET,
+    "player_checked": ClientNextActionType.CHECK,
+    "player_called": ClientNextActionType.CALL,
+    "player_folded": ClientNextActionType.FOLD,
+}
 
 
 """
@@ -128,195 +237,414 @@ and see if there's any actions to process.
 NUM_SEATS = 4
 SM_BLIND = 50
 BG_BLIND = 100
-TABLE_NAME = "Test Table 1"
+TABLE_NAME = "Test Table 1"  # created at start, where clients that don't pick a table go
+MAX_SEATS = 10  # for tables created at runtime
+# all-in equity, sampled runouts and seconds to spend on them
+EQUITY_SAMPLES = 20_000
+EQUITY_TIME_LIMIT = 0.5
+EQUITY_DEADLINE = 2.0
+# pacing, seconds to pause before running a state so players can follow along
+STREET_DELAY = 1  # before dealing the flop, turn and river
+RUNOUT_CARD_DELAY = 1.5  # between cards when running out an all-in board
+END_HAND_DELAY = 3  # showing the final board before paying out
+NEW_HAND_DELAY = 1.5  # showing the payout before the next hand
+# longest a waiting table goes without sending players anything
+KEEPALIVE_INTERVAL = 30
+PACING_DELAYS = {
+    GameState.BEFORE_HAND: NEW_HAND_DELAY,
+    GameState.FLOP: STREET_DELAY,
+    GameState.TURN: STREET_DELAY,
+    GameState.RIVER: STREET_DELAY,
+    GameState.SHOWDOWN_RUNOUT: RUNOUT_CARD_DELAY,
+    GameState.END_HAND: END_HAND_DELAY,
+}
+
+
+async def update_equity(table_info: TableInfo):
+    players = [
+        p for p in table_info.players if p.state_bit & POT_ELIGIBLE_PLAYER_STATES
+    ]
+    hand_num = table_info.hand_num
+    num_board_cards = len(table_info.community_cards)
+    if num_board_cards == 0 and len(players) == 2 and preflop_equity_table is not None:
+        # heads up preflop all-ins are precomputed
+        hero, villain = players[0].hole_cards, players[1].hole_cards
+        players[0].equity = preflop_equity_table.lookup(hero, villain)
+        players[1].equity = preflop_equity_table.lookup(villain, hero)
+        table_registry.wake(table_info.name)
+        return
+    equities = await equity_calculator.calculate(
+        [p.hole_cards for p in players], list(table_info.community_cards)
+    )
+    # the board (or hand) may have moved on while we were calculating
+    if (
+        equities is None
+        or table_info.hand_num != hand_num
+        or len(table_info.community_cards) != num_board_cards
+    ):
+        return
+    for player, equity in zip(players, equities):
+        player.equity = equity
+    table_registry.wake(table_info.name)
 
 
-async def update_state_from_actions(table_info: TableInfo):
-    if (
-        table_info.game_state == GameState.GAME_NOT_STARTED
-    ):  # not used atm, but will after we add a Start Game button
-        # if table_info.get_num_active_players() >= 2:
-        table_info.game_state = GameState.BEFORE_HAND
-        # # set playerState to IN_HAND for all active players
-        # for player in table_info.players:
-        #     if player.state not in [
-        #         PlayerState.SITTING_OUT,
-        #         PlayerState.NOT_SEATED,
-        #     ]:
-        #         player.state = PlayerState.IN_HAND
-    elif table_info.game_state == GameState.BEFORE_HAND:
-        # reset state for new hand
-        table_info.new_hand_reset_state()
-        # TODO handle sit ins here so people can join in this state until we get to 2
-        # remove disconnected players for now, later we'd want to allow people to reconnect under the same name
-        for player in table_info.players:
-            if not player.is_connected:
-                table_info.players.remove(player)
-        # TODO2 if someone has 0 stack, rebuy them for now
-        for player in table_info.players:
-            if player.stack == 0:
-                player.buy_in(10_000)
-        # # set people's states to IN_HAND
-        # for player in table_info.players:
-        #     if player.state not in [
-        #         PlayerState.SITTING_OUT,
-        #         PlayerState.NOT_SEATED,
-        #     ]:
-        #         player.state = PlayerState.IN_HAND
-        if table_info.get_num_active_players() >= 2:
-            # move dealer, here because we need to wait to know who's in the hand to move the dealer
-            if table_info.dealer is None:
-                table_info.dealer = table_info.get_first_seat_starting_at(
-                    0, [PlayerState.IN_HAND]
-                )
-            else:
-                table_info.dealer = table_info.get_next_seat(
-                    table_info.dealer, [PlayerState.IN_HAND]
-                )
-            # force players to pay blinds, account for all-in,
-            #   initializes min bet bookeeping info also.
-            table_info.pay_blinds()
-            # deal hole cards to all active players
-            table_info.deal_hole_cards()
-            # if players are not all in, go to preflop, otherwise go to showdown/end hand
-            table_info.go_to_showdown_or_end_hand_else(GameState.PREFLOP)
-    elif table_info.game_state == GameState.PROCESS_ACTIONS:
-        # process one person's action at a time
-        table_info.perform_next_player_action()
-
-        if not table_info.some_player_needs_to_act():
-            table_info.update_pots()
-            table_info.go_to_showdown_or_end_hand_else(
-                table_info.process_actions_next_state
-            )
-            table_info.process_actions_next_state = None
-        else:
-            table_info.goToNextActionOnIfDone()
-    elif table_info.game_state == GameState.PREFLOP:
-        # don't reset player bet bookkeeping info, blinds have been paid
-        # set action on
-        table_info.action_on = table_info.get_first_to_act_preflop()
-        # loop until everyone has acted
-        table_info.game_state = GameState.PROCESS_ACTIONS
-        table_info.process_actions_next_state = GameState.FLOP
-        # process_player_actions(table_info)
-        # # last thing, add bets to pot, create side pots
-        # table_info.update_pots()
-        # # go to showdown if everyone is all in, otherwise go to flop
-        # table_info.go_to_showdown_or_end_hand_else(GameState.FLOP)
-    elif table_info.game_state == GameState.FLOP:
-        # reset player bet bookkeeping info
-        table_info.new_street_reset_player_bet_info()
-        # deal flop cards
-        table_info.add_n_cards_to_board(3)
-        # set action on
-        table_info.action_on = table_info.get_first_to_act_postflop()
-        # loop until everyone has acted
-        table_info.game_state = GameState.PROCESS_ACTIONS
-        table_info.process_actions_next_state = GameState.TURN
-        # process_player_actions(table_info)
-        # last thing, add bets to pot, create side pots
-        # table_info.update_pots()
-        # go to showdown if everyone is all in, otherwise go to flop
-        # table_info.go_to_showdown_or_end_hand_else(GameState.TURN)
-    elif table_info.game_state == GameState.TURN:
-        # reset player bet bookkeeping info
-        table_info.new_street_reset_player_bet_info()
-        # deal turn card
-        table_info.add_n_cards_to_board(1)
-        # set action on
-        table_info.action_on = table_info.get_first_to_act_postflop()
-        # loop until everyone has acted
-        table_info.game_state = GameState.PROCESS_ACTIONS
-        table_info.process_actions_next_state = GameState.RIVER
-        # process_player_actions(table_info)
-        # last thing, add bets to pot, create side pots
-        # table_info.update_pots()
-        # go to showdown if everyone is all in, otherwise go to flop
-        # table_info.go_to_showdown_or_end_hand_else(GameState.RIVER)
-    elif table_info.game_state == GameState.RIVER:
-        # reset player bet bookkeeping info
-        table_info.new_street_reset_player_bet_info()
-        # deal river card
-        table_info.add_n_cards_to_board(1)
-        # set action on
-        table_info.action_on = table_info.get_first_to_act_postflop()
-        # loop until everyone has acted
-        table_info.game_state = GameState.PROCESS_ACTIONS
-        table_info.process_actions_next_state = GameState.SHOWDOWN
-        # process_player_actions(table_info)
-        # last thing, add bets to pot, create side pots
-        # table_info.update_pots()
-        # go to showdown if everyone is all in, otherwise go to flop
-        # table_info.go_to_showdown_or_end_hand_else(GameState.SHOWDOWN)
-    elif table_info.game_state == GameState.SHOWDOWN:
-        # flip players cards
-        table_info.show_eligible_players_cards()
-        # TODO2 show remaining community cards one-by-one with timer between
-        table_info.game_state = GameState.SHOWDOWN_RUNOUT
-    elif table_info.game_state == GameState.SHOWDOWN_RUNOUT:
-        if len(table_info.community_cards) < 5:
-            table_info.add_n_cards_to_board(1)
-        if len(table_info.community_cards) == 5:
-            table_info.game_state = GameState.END_HAND
-    elif table_info.game_state == GameState.END_HAND:
-        await asyncio.sleep(3)
-        # distributes pots to winners
-        table_info.distribute_pots_to_winners()
-        # handle sit outs/sit ins/disconnects (actually just do in start hand)
-        # set playerState to IN_HAND for all active players (maybe do this in before hand also)
-        # for player in table_info.players:
-        #     if player.state not in [
-        #         PlayerState.SITTING_OUT,
-        #         PlayerState.NOT_SEATED,
-        #     ]:
-        #         player.state = PlayerState.IN_HAND
-        table_info.hand_num += 1
-        table_info.action_num = 0
-        table_info.game_state = GameState.BEFORE_HAND
-
-
-async def send_updated_state_to_players(table_info: TableInfo):
+""" Runs update_equity in the background so the game loop never waits on it. """
+
+
+def schedule_equity_update(table_info: TableInfo):
+    if equity_calculator is not None:
+        asyncio.create_task(update_equity(table_info))
+
+
+"""
+Pauses the table for a pacing delay. Anything that wakes it meanwhile (an
+equity result, a player joining) is sent right away instead of after the
+next transition, which would already have dealt another card.
+"""
+
+
+async def pacing_delay(entry: TableEntry, delay):
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + delay
+    while True:
+        try:
+            await asyncio.wait_for(entry.wakeup.wait(), deadline - loop.time())
+        except asyncio.TimeoutError:
+            return
+        entry.wakeup.clear()
+        await send_updated_state_to_players(entry)
+
+
+async def wait_for_input(entry: TableEntry, timeout):
+    if timeout == float("inf"):
+        timeout = None
+    try:
+        await asyncio.wait_for(entry.wakeup.wait(), timeout)
+    except asyncio.TimeoutError:
+        pass
+    entry.wakeup.clear()
+
+
+""" A public_table_info message with the whole public view, see TableViewStore. """
+
+
+def public_view_snapshot(entry: TableEntry, sent_at):
+    return {
+        "view_num": entry.table_info.view_num,
+        "snapshot": entry.last_public_view,
+        "sent_at": sent_at,
+    }
+
+
+"""
+Sends players what changed since the last update. Nothing is sent if
+nothing they can see changed, unless KEEPALIVE_INTERVAL has passed, then
+they get an empty patch so clients that missed one notice and resync.
+"""
+
+
+async def send_updated_state_to_players(entry: TableEntry):
+    table_info = entry.table_info
+    public_view = table_info.get_public_view()
+    # lets loadtest.py measure how long the update took to reach each player
+    sent_at = time.time()
+    keepalive = sent_at - entry.last_public_view_sent_at >= KEEPALIVE_INTERVAL
+    patch = None
+    if entry.last_public_view is not None:
+        # only what changed since the last update
+        patch = diff_view(entry.last_public_view, public_view)
+    changed = patch is None or len(patch) > 0
+    if changed:
+        table_info.view_num += 1
+        entry.last_public_view = public_view
+    view_num = table_info.view_num
+    if patch is None:
+        message = {"view_num": view_num, "snapshot": public_view}
+    else:
+        base_view_num = view_num - 1 if changed else view_num
+        message = {"view_num": view_num, "base_view_num": base_view_num, "patch": patch}
+    message["sent_at"] = sent_at
+    # players who just joined have nothing to patch yet, snapshot them first
+    for sid in entry.snapshot_sids:
+        await emitter.emit(
+            "public_table_info", public_view_snapshot(entry, sent_at), sid
+        )
+    entry.snapshot_sids.clear()
+    if changed or keepalive:
+        entry.last_public_view_sent_at = sent_at
+        # the same for everyone, so it's built and serialized once for the room
+        await emitter.emit("public_table_info", message, table_room(table_info.name))
+    # then each player's hole cards and action prompt, only to them
     for player in table_info.players:
-        # get dict representing table_info (for each player's view, controls which cards they see, etc.)
-        player_view = table_info.get_view(player)
-        # send to each player
-        print(player_view)
-        await sio.emit("updated_table_info", player_view, room=player.sio_id)
+        private_view = table_info.get_private_view(player)
+        # a new view_num changes it too, so clients can pair it with the public view
+        if keepalive or private_view != entry.last_private_views.get(player.sio_id):
+            entry.last_private_views[player.sio_id] = private_view
+            await emitter.emit("private_table_info", private_view, player.sio_id)
 
 
+# LocalTables, or ShardedTables when tables run in worker processes
+tables = None
+# SocketEmitter, or a pipe back to the socket process in a worker
+emitter = None
 # modified by incoming events
-table_info: TableInfo = None
+table_registry: TableRegistry = None
+equity_calculator: EquityCalculator = None
+preflop_equity_table: PreflopEquityTable = None
+trace_recorder: TraceRecorder = None
+# tables get their own deck seed derived from this one, if set
+server_seed: int = None
+
+TABLE_CONFIG = {
+    "name": TABLE_NAME,
+    "num_seats": NUM_SEATS,
+    "sm_blind": SM_BLIND,
+    "bg_blind": BG_BLIND,
+}
+
+
+def table_seed(table_name):
+    # str seeds hash the same way in every process, unlike hash()
+    return random.Random(f"{server_seed}/{table_name}").getrandbits(64)
+
+
+"""
+Table operations, run wherever the table lives: on this process's event
+loop, or in a worker process when tables are sharded (see workers.py).
+Arguments and results are plain data so they can cross a pipe.
+"""
+
+
+def join_table(table_name, sid):
+    # returns why the player can't join, or None once they're seated
+    entry = table_registry.get_table(table_name)
+    if entry is None:
+        return f"no table named {table_name}"
+    open_seats = entry.table_info.get_open_seats()
+    if not open_seats:
+        return f"{table_name} is full"
+    name = "Player " + str(random.randint(1, 999))
+    seat = random.choice(open_seats)
+    record_event("connect", table_name, sid, {"name": name, "seat": seat})
+    seat_new_player(entry.table_info, sid, name, seat)
+    table_registry.join(sid, table_name)
+    entry.snapshot_sids.add(sid)
+    entry.wake()
+    return None
+
+
+def leave_table(sid):
+    entry = table_registry.get_table_for_sid(sid)
+    table_registry.leave(sid)
+    if entry is not None:
+        entry.snapshot_sids.discard(sid)
+        entry.last_private_views.pop(sid, None)
+        record_event("disconnect", entry.table_info.name, sid)
+        mark_player_disconnected(entry.table_info, sid)
+        entry.wake()
+
+
+def apply_player_action(sid, event, data):
+    entry = table_registry.get_table_for_sid(sid)
+    if entry is None:
+        return
+    record_event(event, entry.table_info.name, sid, data)
+    queue_player_action(entry.engine, sid, PLAYER_ACTION_EVENTS[event], data)
+    entry.wake()
+
+
+def resync_table_view(sid):
+    # the latest public view for a player who missed an update, None if there's none
+    entry = table_registry.get_table_for_sid(sid)
+    if entry is None or entry.last_public_view is None:
+        return None
+    return public_view_snapshot(entry, time.time())
+
+
+def create_table(table_config):
+    # returns why the table can't be created, or None
+    if table_registry.get_table(table_config["name"]) is not None:
+        return f"table {table_config['name']} already exists"
+    table_info = TableInfo(**table_config)
+    seed = None
+    if server_seed is not None:
+        seed = table_seed(table_info.name)
+        # shuffled from the seed instead of OS entropy, so the session can be replayed
+        table_info.deck_pool = SeededDecks(seed)
+    record_event(
+        "create_table", table_info.name, data={"config": table_config, "seed": seed}
+    )
+    table_registry.create_table(
+        Engine(table_info, clock=time.time, on_equity_changed=schedule_equity_update)
+    )
+    return None
+
+
+def close_table(name):
+    # returns the sids that were at the table, or None if there's no such table
+    if table_registry.get_table(name) is None:
+        return None
+    record_event("close_table", name)
+    return table_registry.close_table(name)
+
+
+def list_tables():
+    return table_registry.list_tables()
+
+
+TABLE_OPS = {
+    "join_table": join_table,
+    "leave_table": leave_table,
+    "player_action": apply_player_action,
+    "resync_table_view": resync_table_view,
+    "create_table": create_table,
+    "close_table": close_table,
+    "list_tables": list_tables,
+}
+
+
+class LocalTables:
+    async def join_table(self, table_name, sid):
+        return join_table(table_name, sid)
+
+    async def leave_table(self, sid):
+        leave_table(sid)
+
+    async def player_action(self, sid, event, data):
+        apply_player_action(sid, event, data)
+
+    async def resync_table_view(self, sid):
+        return resync_table_view(sid)
+
+    async def create_table(self, table_config):
+        return create_table(table_config)
 
+    async def close_table(self, name):
+        return close_table(name)
 
-async def game_loop():
-    # initialize table_info (different from reset table info)
-    global table_info
-    table_info = TableInfo(
-        name=TABLE_NAME,
-        num_seats=NUM_SEATS,
-        sm_blind=SM_BLIND,
-        bg_blind=BG_BLIND,
+    async def list_tables(self):
+        return list_tables()
+
+    def shutdown(self):
+        stop_hosting_tables()
+
+
+class SocketEmitter:
+    async def emit(self, event, data, room):
+        await sio.emit(event, data, room=room)
+
+
+""" Sets up this process to run tables, either the only server process or a worker. """
+
+
+def start_hosting_tables(seed=None, trace_path=None, equity_workers=None):
+    global equity_calculator, preflop_equity_table, trace_recorder
+    global table_registry, server_seed
+    server_seed = seed
+    if trace_path is not None:
+        trace_recorder = TraceRecorder(trace_path, seed)
+        print(f"recording trace to {trace_path} with seed {seed}")
+    preflop_equity_table = load_preflop_equity_table()
+    equity_calculator = EquityCalculator(
+        samples=EQUITY_SAMPLES,
+        time_limit=EQUITY_TIME_LIMIT,
+        deadline=EQUITY_DEADLINE,
+        max_workers=equity_workers,
     )
+    table_registry = TableRegistry(game_loop)
+
+
+def stop_hosting_tables():
+    equity_calculator.shutdown()
+    if trace_recorder is not None:
+        trace_recorder.close()
+
+
+async def game_loop(entry: TableEntry):
+    table_info, engine = entry.table_info, entry.engine
     while True:
+        if table_info.game_state in PACING_DELAYS:
+            await pacing_delay(entry, PACING_DELAYS[table_info.game_state])
         # check for NextPlayerActions and update state
-        await update_state_from_actions(table_info)
+        record_event("tick", table_info.name)
+        engine.advance()
         print(table_info.game_state)
         # Send updated TableInfo to everyone
         #  contains actions for players also
-        await send_updated_state_to_players(table_info)
-        await asyncio.sleep(1.5)
-
-
-async def main():
-    asyncio.create_task(game_loop())
+        await send_updated_state_to_players(entry)
+        # run transitions back to back until we need a player to do something
+        timeout = engine.seconds_until_input_needed()
+        if timeout is None:
+            await asyncio.sleep(0)
+        else:
+            await wait_for_input(entry, min(timeout, KEEPALIVE_INTERVAL))
+
+
+async def main(args):
+    global tables, emitter
+    seed = args.seed
+    if args.record_trace is not None and seed is None:
+        # a replay needs the seed, so pick one
+        seed = int.from_bytes(os.urandom(8), "little")
+    if args.broker:
+        broker_url = urllib.parse.urlparse(args.message_queue)
+        await start_broker(broker_url.hostname, broker_url.port)
+    if args.message_queue is not None:
+        manager = make_client_manager(args.message_queue)
+        use_client_manager(sio, manager)
+    emitter = SocketEmitter()
+    if args.workers > 0:
+        tables = ShardedTables(args.workers, emitter, seed, args.record_trace)
+        tables.start()
+    else:
+        start_hosting_tables(seed, args.record_trace)
+        tables = LocalTables()
+    if args.message_queue is not None:
+        ring = HashRing(args.nodes.split(","))
+        tables = NodeTables(tables, args.node, ring, manager)
+        print(f"node {args.node} of {ring.nodes}")
+    if not isinstance(tables, NodeTables) or tables.owns(TABLE_NAME):
+        await tables.create_table(TABLE_CONFIG)
 
     # start uvicorn server
-    config = uvicorn.Config(app, host=address, port=port)
+    config = uvicorn.Config(app, host=address, port=args.port)
     server = uvicorn.Server(config)
     await server.serve()
+    tables.shutdown()
     print("Server shut down.")
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=port)
+    parser.add_argument("--seed", type=int, help="shuffle decks from this seed")
+    parser.add_argument(
+        "--record-trace",
+        metavar="PATH",
+        help="record every input to PATH so the session can be replayed",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=0,
+        help="run tables in this many worker processes, 0 runs them in this one",
+    )
+    # several nodes serving one table set, see cluster.py
+    parser.add_argument(
+        "--message-queue",
+        metavar="URL",
+        help="loopback://host:port or redis://host:port shared by every node",
+    )
+    parser.add_argument("--node", help="this node's name, must be in --nodes")
+    parser.add_argument("--nodes", help="comma separated names of every node")
+    parser.add_argument(
+        "--broker",
+        action="store_true",
+        help="host the loopback broker for --message-queue in this process",
+    )
+    args = parser.parse_args()
+    if args.message_queue is not None and (
+        args.node is None or args.node not in (args.nodes or "").split(",")
+    ):
+        parser.error("--message-queue needs --node, and --nodes including it")
+    asyncio.run(main(args))
@@ -0,0 +1,53 @@
+"""
+Input traces for replaying a server session (see replay.py).
+
+A trace is a JSON lines file. The first line is a header with the server
+seed, every line after is one input in the order the game loops saw it,
+tagged with the table it went to:
+    {"t": 1712345678.9, "event": "player_bet", "table": "...", "sid": "...", "data": {...}}
+"create_table" and "close_table" events carry each table's config and
+deck seed, and "tick" events mark each call to Engine.advance, so a
+replay interleaves actions and state transitions exactly like the live
+server did.
+"""
+
+import json
+import time
+
+TRACE_VERSION = 2
+
+
+class TraceRecorder:
+    def __init__(self, path, seed):
+        # line buffered so a crash loses at most the event being written
+        self.file = open(path, "w", buffering=1, encoding="utf-8")
+        self.file.write(json.dumps({"version": TRACE_VERSION, "seed": seed}) + "\n")
+
+    def record(self, event, table_name, sid=None, data=None):
+        self.file.write(
+            json.dumps(
+                {
+                    "t": time.time(),
+                    "event": event,
+                    "table": table_name,
+                    "sid": sid,
+                    "data": data,
+                }
+            )
+            + "\n"
+        )
+
+    def close(self):
+        self.file.close()
+
+
+""" Returns (header, events), events is a list of dicts in recorded order. """
+
+
+def read_trace(path):
+    with open(path, encoding="utf-8") as f:
+        header = json.loads(f.readline())
+        if header.get("version") != TRACE_VERSION:
+            raise ValueError(f"{path} has unsupported trace version")
+        events = [json.loads(line) for line in f if line.strip()]
+    return header, events
@@ -0,0 +1,229 @@
+"""
+Self-play farm: scripted bots play M tables of N hands each on the headless
+engine, spread over every core with a process pool, and the per-hand
+results are folded into one set of statistics as tables finish.
+
+Use it to stress-test rule changes (side pots, all-in runouts) and to
+measure engine throughput:
+    python3 simulate.py --tables 64 --hands 2000 --policies tight,raiser,calling_station,random
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+import evaluator
+from shared import (
+    TableInfo,
+    PlayerInfo,
+    ClientPlayerAction,
+    ClientNextAction,
+    ClientNextActionType,
+    SeededDecks,
+    card_rank,
+)
+from engine import Engine, HandResult
+
+"""
+Bot policies pick an action for the player being asked to act. They only
+see what a player at the table could, plus their own hand rank.
+"""
+
+
+def calling_station(player: PlayerInfo, cpa: ClientPlayerAction, rng):
+    if cpa.can_check:
+        return ClientNextAction(ClientNextActionType.CHECK)
+    return ClientNextAction(ClientNextActionType.CALL)
+
+
+def raiser(player: PlayerInfo, cpa: ClientPlayerAction, rng):
+    if cpa.can_raise:
+        return ClientNextAction(
+            ClientNextActionType.BET,
+            min(cpa.min_raise, player.stack + player.current_bet),
+        )
+    return calling_station(player, cpa, rng)
+
+
+def random_policy(player: PlayerInfo, cpa: ClientPlayerAction, rng):
+    r = rng.random()
+    if r < 0.15 and not cpa.can_check:
+        return ClientNextAction(ClientNextActionType.FOLD)
+    if r < 0.75 or not cpa.can_raise:
+        return calling_station(player, cpa, rng)
+    bet_amount = cpa.min_raise + rng.randint(0, 5) * cpa.min_raise // 2
+    return ClientNextAction(
+        ClientNextActionType.BET, min(bet_amount, player.stack + player.current_bet)
+    )
+
+
+def tight(player: PlayerInfo, cpa: ClientPlayerAction, rng):
+    if player.hand_rank is None:
+        # preflop, pairs and two big cards only
+        rank1, rank2 = (card_rank(card) for card in player.hole_cards)
+        strength = 2 if rank1 == rank2 and rank1 >= 8 else 0
+        if rank1 == rank2 or min(rank1, rank2) >= 8:
+            strength = max(strength, 1)
+    else:
+        category = evaluator.hand_category(player.hand_rank)
+        strength = 2 if category >= evaluator.TWO_PAIR else int(
+            category == evaluator.PAIR
+        )
+    if strength == 2:
+        return raiser(player, cpa, rng)
+    if strength == 1 or cpa.can_check:
+        return calling_station(player, cpa, rng)
+    return ClientNextAction(ClientNextActionType.FOLD)
+
+
+POLICIES = {
+    "calling_station": calling_station,
+    "raiser": raiser,
+    "random": random_policy,
+    "tight": tight,
+}
+
+
+class PolicyStats:
+    def __init__(self):
+        self.hands = 0
+        self.hands_won = 0
+        self.net = 0
+
+    def merge(self, other: "PolicyStats"):
+        self.hands += other.hands
+        self.hands_won += other.hands_won
+        self.net += other.net
+
+
+class SimStats:
+    def __init__(self):
+        self.hands = 0
+        self.total_pot = 0
+        self.max_pot = 0
+        self.showdowns = 0
+        self.policies: Dict[str, PolicyStats] = {}
+
+    def add_hand(self, result: HandResult, policy_by_player):
+        self.hands += 1
+        self.total_pot += result.pot
+        self.max_pot = max(self.max_pot, result.pot)
+        self.showdowns += result.showdown
+        for name, net in result.net.items():
+            stats = self.policies.setdefault(policy_by_player[name], PolicyStats())
+            stats.hands += 1
+            stats.hands_won += net > 0
+            stats.net += net
+
+    def merge(self, other: "SimStats"):
+        self.hands += other.hands
+        self.total_pot += other.total_pot
+        self.max_pot = max(self.max_pot, other.max_pot)
+        self.showdowns += other.showdowns
+        for policy, other_stats in other.policies.items():
+            self.policies.setdefault(policy, PolicyStats()).merge(other_stats)
+
+
+""" Plays one table to the end in a worker process, returns its SimStats. """
+
+
+def run_table(table_ind, num_hands, policies, sm_blind, bg_blind, seed):
+    # separate streams for the bots and the decks, both drawn from on this
+    # thread, so a seed always plays the same hands
+    rng = random.Random(f"{seed}/{table_ind}")
+    table_info = TableInfo(f"sim {table_ind}", len(policies), sm_blind, bg_blind)
+    table_info.deck_pool = SeededDecks(f"{seed}/{table_ind}/decks")
+    policy_by_player = {}
+    for seat, policy in enumerate(policies):
+        name = f"{policy} {seat}"
+        table_info.add_player(name=name, seat=seat, sio_id=None)
+        policy_by_player[name] = policy
+
+    stats = SimStats()
+    engine = Engine(
+        table_info,
+        on_hand_finished=lambda result: stats.add_hand(result, policy_by_player),
+    )
+    result = engine.step()
+    while stats.hands < num_hands:
+        player = result.player
+        action = POLICIES[policy_by_player[player.name]](
+            player, result.player_action, rng
+        )
+        result = engine.step(action)
+    return stats
+
+
+def print_report(stats: SimStats, bg_blind, elapsed):
+    print(
+        f"\n{stats.hands:,} hands in {elapsed:.1f}s,"
+        f" {stats.hands / elapsed:,.0f} hands/sec"
+    )
+    print(
+        f"average pot {stats.total_pot / stats.hands:,.0f}, biggest {stats.max_pot:,},"
+        f" showdowns {stats.showdowns / stats.hands:.1%}"
+    )
+    print(f"\n  {'policy':16} {'hands':>10} {'won':>8} {'bb/100':>10}")
+    for policy, policy_stats in sorted(stats.policies.items()):
+        print(
+            f"  {policy:16} {policy_stats.hands:>10,}"
+            f" {policy_stats.hands_won / policy_stats.hands:>8.1%}"
+            f" {policy_stats.net / bg_blind / policy_stats.hands * 100:>10.1f}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--tables", type=int, default=os.cpu_count())
+    parser.add_argument("--hands", type=int, default=1000, help="per table")
+    parser.add_argument(
+        "--policies",
+        default="tight,raiser,calling_station,random",
+        help=f"one per seat, from {', '.join(POLICIES)}",
+    )
+    parser.add_argument("--sm-blind", type=int, default=50)
+    parser.add_argument("--bg-blind", type=int, default=100)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    policies = args.policies.split(",")
+    for policy in policies:
+        if policy not in POLICIES:
+            parser.error(f"unknown policy {policy}")
+    if len(policies) < 2:
+        parser.error("a table needs at least 2 players")
+
+    start_time = time.perf_counter()
+    stats = SimStats()
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        futures = [
+            executor.submit(
+                run_table,
+                table_ind,
+                args.hands,
+                policies,
+                args.sm_blind,
+                args.bg_blind,
+                args.seed,
+            )
+            for table_ind in range(args.tables)
+        ]
+        for num_done, future in enumerate(as_completed(futures), start=1):
+            stats.merge(future.result())
+            elapsed = time.perf_counter() - start_time
+            print(
+                f"{num_done}/{args.tables} tables, {stats.hands:,} hands,"
+                f" {stats.hands / elapsed:,.0f} hands/sec"
+            )
+    print_report(stats, args.bg_blind, time.perf_counter() - start_time)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Every table the server is hosting, each with its own game loop task.
+
+Tables are keyed by name (TableInfo.name is unique among tables), and the
+registry remembers which table each connected sid is at. It doesn't know
+how a game loop works, server.py passes in the coroutine to run for each
+table.
+"""
+
+import asyncio
+from typing import Dict, List, Set
+
+from engine import Engine
+
+
+class TableEntry:
+    def __init__(self, engine: Engine):
+        self.engine = engine
+        self.table_info = engine.table_info
+        # set when an input arrives, so the game loop doesn't have to poll
+        self.wakeup = asyncio.Event()
+        self.task: asyncio.Task = None
+        # the public view players were last sent, the base for the next patch
+        self.last_public_view = None
+        self.last_public_view_sent_at = 0.0
+        # by sid, so unchanged ones aren't sent again
+        self.last_private_views: Dict[str, dict] = {}
+        # players who just joined, they get a snapshot with the next update
+        self.snapshot_sids: Set[str] = set()
+
+    def wake(self):
+        self.wakeup.set()
+
+
+class TableRegistry:
+    def __init__(self, run_table):
+        # run_table(entry) is the game loop coroutine for one table
+        self.run_table = run_table
+        self.tables: Dict[str, TableEntry] = {}
+        self.table_name_by_sid: Dict[str, str] = {}
+
+    def create_table(self, engine: Engine) -> TableEntry:
+        table_info = engine.table_info
+        if table_info.name in self.tables:
+            raise ValueError(f"table {table_info.name} already exists")
+        entry = TableEntry(engine)
+        self.tables[table_info.name] = entry
+        entry.task = asyncio.create_task(self.run_table(entry))
+        return entry
+
+    """ Stops the table's game loop, returns the sids that were at it. """
+
+    def close_table(self, name) -> List[str]:
+        entry = self.tables.pop(name)
+        entry.task.cancel()
+        sids = [sid for sid, table in self.table_name_by_sid.items() if table == name]
+        for sid in sids:
+            del self.table_name_by_sid[sid]
+        return sids
+
+    def get_table(self, name) -> TableEntry:
+        return self.tables.get(name)
+
+    def join(self, sid, name):
+        self.table_name_by_sid[sid] = name
+
+    def leave(self, sid):
+        return self.table_name_by_sid.pop(sid, None)
+
+    def get_table_for_sid(self, sid) -> TableEntry:
+        name = self.table_name_by_sid.get(sid)
+        return None if name is None else self.tables.get(name)
+
+    def wake(self, name):
+        entry = self.tables.get(name)
+        if entry is not None:
+            entry.wake()
+
+    def list_tables(self):
+        return [
+            {
+                "name": name,
+                "num_seats": entry.table_info.num_seats,
+                "sm_blind": entry.table_info.sm_blind,
+                "bg_blind": entry.table_info.bg_blind,
+                "num_players": len(entry.table_info.players),
+                "open_seats": len(entry.table_info.get_open_seats()),
+            }
+            for name, entry in self.tables.items()
+        ]
@@ -0,0 +1,220 @@
+"""
+Runs tables in worker processes so a server can use every core.
+
+The socket process (server.py --workers N) owns every socket.io
+connection. Each table lives in exactly one worker, which runs the same
+game loops as a single process server and sends every emit back over its
+pipe for the socket process to deliver. Inbound events go the other way as
+calls to server.TABLE_OPS, routed by table name or by the sid's table.
+
+With --record-trace PATH each worker records its own tables to PATH.N,
+and each of those files replays on its own.
+"""
+
+import asyncio
+import functools
+import itertools
+import multiprocessing
+import signal
+import threading
+from typing import Dict, List
+
+
+def read_messages(conn, loop, callback):
+    # pipes block, so read on a thread and hand each message to the loop.
+    # None means the other end stopped or went away
+    while True:
+        try:
+            msg = conn.recv()
+        except (EOFError, OSError):
+            msg = None
+        try:
+            loop.call_soon_threadsafe(callback, msg)
+        except RuntimeError:
+            # the loop already finished
+            return
+        if msg is None:
+            return
+
+
+class PipeEmitter:
+    def __init__(self, conn):
+        self.conn = conn
+
+    async def emit(self, event, data, room):
+        # blocks if the socket process falls behind, slowing our tables with it
+        self.conn.send(("emit", event, data, room))
+
+
+async def serve_tables(server, conn, seed, trace_path):
+    loop = asyncio.get_running_loop()
+    inbox = asyncio.Queue()
+    threading.Thread(
+        target=read_messages, args=(conn, loop, inbox.put_nowait), daemon=True
+    ).start()
+    server.emitter = PipeEmitter(conn)
+    # every worker has its own equity pool, so keep them small
+    server.start_hosting_tables(seed, trace_path, equity_workers=1)
+    while True:
+        msg = await inbox.get()
+        if msg is None:
+            break
+        _, req_id, op, args = msg
+        result = server.TABLE_OPS[op](*args)
+        if req_id is not None:
+            conn.send(("reply", req_id, result))
+    server.stop_hosting_tables()
+
+
+def worker_main(conn, seed, trace_path):
+    # the socket process handles ctrl-c, and tells us when to stop
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    import server
+
+    asyncio.run(serve_tables(server, conn, seed, trace_path))
+
+
+class Worker:
+    def __init__(self, ind, process, conn):
+        self.ind = ind
+        self.process = process
+        self.conn = conn
+        self.pending: Dict[int, asyncio.Future] = {}
+        # emits are delivered in the order the worker sent them
+        self.emits = asyncio.Queue()
+        self.num_tables = 0
+
+
+class ShardedTables:
+    def __init__(self, num_workers, emitter, seed=None, trace_path=None):
+        self.num_workers = num_workers
+        self.emitter = emitter
+        self.seed = seed
+        self.trace_path = trace_path
+        self.workers: List[Worker] = []
+        self.worker_by_table: Dict[str, Worker] = {}
+        self.worker_by_sid: Dict[str, Worker] = {}
+        self.req_ids = itertools.count()
+
+    def start(self):
+        loop = asyncio.get_running_loop()
+        # spawn, forking a process with running threads isn't safe
+        context = multiprocessing.get_context("spawn")
+        for ind in range(self.num_workers):
+            conn, child_conn = context.Pipe()
+            trace_path = None
+            if self.trace_path is not None:
+                trace_path = f"{self.trace_path}.{ind}"
+            process = context.Process(
+                target=worker_main,
+                args=(child_conn, self.seed, trace_path),
+                name=f"table-worker-{ind}",
+            )
+            process.start()
+            child_conn.close()
+            worker = Worker(ind, process, conn)
+            self.workers.append(worker)
+            on_message = functools.partial(self.on_message, worker)
+            threading.Thread(
+                target=read_messages, args=(conn, loop, on_message), daemon=True
+            ).start()
+            asyncio.create_task(self.deliver_emits(worker))
+        print(f"started {self.num_workers} table workers")
+
+    def on_message(self, worker: Worker, msg):
+        if msg is None:
+            print(f"table worker {worker.ind} stopped")
+            for future in worker.pending.values():
+                if not future.done():
+                    future.set_exception(ConnectionError("table worker exited"))
+            worker.pending.clear()
+            return
+        if msg[0] == "reply":
+            _, req_id, result = msg
+            future = worker.pending.pop(req_id, None)
+            if future is not None and not future.done():
+                future.set_result(result)
+        elif msg[0] == "emit":
+            worker.emits.put_nowait(msg[1:])
+
+    async def deliver_emits(self, worker: Worker):
+        while True:
+            event, data, room = await worker.emits.get()
+            await self.emitter.emit(event, data, room)
+
+    async def call(self, worker: Worker, op, *args):
+        req_id = next(self.req_ids)
+        future = asyncio.get_running_loop().create_future()
+        worker.pending[req_id] = future
+        worker.conn.send(("call", req_id, op, args))
+        return await future
+
+    def notify(self, worker: Worker, op, *args):
+        # no reply wanted
+        worker.conn.send(("call", None, op, args))
+
+    async def join_table(self, table_name, sid):
+        worker = self.worker_by_table.get(table_name)
+        if worker is None:
+            return f"no table named {table_name}"
+        error = await self.call(worker, "join_table", table_name, sid)
+        if error is None:
+            self.worker_by_sid[sid] = worker
+        return error
+
+    async def leave_table(self, sid):
+        worker = self.worker_by_sid.pop(sid, None)
+        if worker is not None:
+            self.notify(worker, "leave_table", sid)
+
+    async def player_action(self, sid, event, data):
+        worker = self.worker_by_sid.get(sid)
+        if worker is not None:
+            self.notify(worker, "player_action", sid, event, data)
+
+    async def resync_table_view(self, sid):
+        worker = self.worker_by_sid.get(sid)
+        if worker is None:
+            return None
+        return await self.call(worker, "resync_table_view", sid)
+
+    async def create_table(self, table_config):
+        name = table_config["name"]
+        if name in self.worker_by_table:
+            return f"table {name} already exists"
+        worker = min(self.workers, key=lambda w: w.num_tables)
+        # claim the name before awaiting so a concurrent create can't take it
+        self.worker_by_table[name] = worker
+        worker.num_tables += 1
+        error = await self.call(worker, "create_table", table_config)
+        if error is not None:
+            del self.worker_by_table[name]
+            worker.num_tables -= 1
+        return error
+
+    async def close_table(self, name):
+        worker = self.worker_by_table.pop(name, None)
+        if worker is None:
+            return None
+        worker.num_tables -= 1
+        sids = await self.call(worker, "close_table", name)
+        for sid in sids or []:
+            self.worker_by_sid.pop(sid, None)
+        return sids
+
+    async def list_tables(self):
+        lists = await asyncio.gather(
+            *[self.call(worker, "list_tables") for worker in self.workers]
+        )
+        return [table for table_list in lists for table in table_list]
+
+    def shutdown(self):
+        # closing our end doesn't wake the reader thread blocked on it, so
+        # the worker wouldn't see EOF, tell it to stop instead
+        for worker in self.workers:
+            worker.conn.send(None)
+        for worker in self.workers:
+            worker.process.join(timeout=5)
+            if worker.process.is_alive():
+                worker.process.terminate()
+            worker.conn.close()
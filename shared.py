@@ -1,11 +1,23 @@
-from typing import List
-from enum import Enum
-import secrets
+from typing import Dict, List
+from enum import Enum, IntFlag
 from collections import defaultdict
+import copy
 import json
+import logging
+import os
+import queue
+import random
+import struct
+import threading
 import time
 
-sys_rand = secrets.SystemRandom()
+try:
+    # server only, clients just auto-update client.py and shared.py
+    import evaluator
+except ImportError:
+    evaluator = None
+
+logger = logging.getLogger(__name__)
 
 """
 Game State for Hold Em' specifically.
@@ -32,28 +44,30 @@ class GameState(Enum):
     PROCESS_ACTIONS = 8
 
 
-class PlayerState(Enum):
-    NOT_SEATED = 0  # just watching
+class PlayerState(IntFlag):
+    # one bit each, so a group of states is a mask and membership is one AND
+    NOT_SEATED = 1 << 0  # just watching
 
-    SITTING_OUT = 1  # chose to sit out and not play hands
+    SITTING_OUT = 1 << 1  # chose to sit out and not play hands
 
     NOT_IN_HAND = (
-        2  # seated but waiting for next hand, similar to folded, if joins late
+        1 << 2  # seated but waiting for next hand, similar to folded, if joins late
     )
 
-    IN_HAND = 3  # playing current hand, haven't chose an action this street
+    IN_HAND = 1 << 3  # playing current hand, haven't chose an action this street
     # previous action in street, at start of each street is set to IN_HAND
-    FOLDED = 4
-    CHECKED = 5
-    CALLED = 6
-    BET = 7  # same as raised but only if everyone before checks
-    RAISED = 8
-    ALL_IN = 9
+    FOLDED = 1 << 4
+    CHECKED = 1 << 5
+    CALLED = 1 << 6
+    BET = 1 << 7  # same as raised but only if everyone before checks
+    RAISED = 1 << 8
+    ALL_IN = 1 << 9
 
-    # DISCONNECTED = 10  # should check/fold if time is called
+    # DISCONNECTED = 1 << 10  # should check/fold if time is called
 
     def encode(self):
-        return str(self)
+        # str() of an IntFlag is just the number on newer Pythons
+        return f"PlayerState.{self.name}"
 
     @staticmethod
     def decode(d):
@@ -63,47 +77,71 @@ class PlayerState(Enum):
         return PlayerState[member]
 
 
-# player states who are in the current hand
-ACTIVE_PLAYER_STATES = [
-    PlayerState.IN_HAND,
-    PlayerState.FOLDED,
-    PlayerState.CHECKED,
-    PlayerState.CALLED,
-    PlayerState.BET,
-    PlayerState.RAISED,
-    PlayerState.ALL_IN,
-    # PlayerState.DISCONNECTED,
-]
+# seconds a player has to act before they're removed from their seat
+ACTION_TIMEOUT = 60 * 5
 
-# player states who still may need to act
-MAY_NEED_TO_ACT_PLAYER_STATES = [
-    PlayerState.IN_HAND,
-    PlayerState.CHECKED,
-    PlayerState.CALLED,
-    PlayerState.BET,
-    PlayerState.RAISED,
-    # PlayerState.DISCONNECTED,
-]
+"""
+Groups of player states, as masks to test PlayerInfo.state_bit against. They're
+plain ints, IntFlag's own operators run in Python and are slower than a list.
+"""
 
-POT_ELIGIBLE_PLAYER_STATES = [
-    PlayerState.IN_HAND,
-    PlayerState.CHECKED,
-    PlayerState.CALLED,
-    PlayerState.BET,
-    PlayerState.RAISED,
-    PlayerState.ALL_IN,
-]
+# player states who are in the current hand
+ACTIVE_PLAYER_STATES = int(
+    PlayerState.IN_HAND
+    | PlayerState.FOLDED
+    | PlayerState.CHECKED
+    | PlayerState.CALLED
+    | PlayerState.BET
+    | PlayerState.RAISED
+    | PlayerState.ALL_IN
+    # | PlayerState.DISCONNECTED
+)
 
-ELIGIBLE_TO_PLAY_PLAYER_STATES = [
-    PlayerState.IN_HAND,
-    PlayerState.FOLDED,
-    PlayerState.CHECKED,
-    PlayerState.CALLED,
-    PlayerState.BET,
-    PlayerState.RAISED,
-    PlayerState.ALL_IN,
-    PlayerState.NOT_IN_HAND,
-]
+# player states who still may need to act
+MAY_NEED_TO_ACT_PLAYER_STATES = int(
+    PlayerState.IN_HAND
+    | PlayerState.CHECKED
+    | PlayerState.CALLED
+    | PlayerState.BET
+    | PlayerState.RAISED
+    # | PlayerState.DISCONNECTED
+)
+
+POT_ELIGIBLE_PLAYER_STATES = int(
+    PlayerState.IN_HAND
+    | PlayerState.CHECKED
+    | PlayerState.CALLED
+    | PlayerState.BET
+    | PlayerState.RAISED
+    | PlayerState.ALL_IN
+)
+
+ELIGIBLE_TO_PLAY_PLAYER_STATES = int(
+    PlayerState.IN_HAND
+    | PlayerState.FOLDED
+    | PlayerState.CHECKED
+    | PlayerState.CALLED
+    | PlayerState.BET
+    | PlayerState.RAISED
+    | PlayerState.ALL_IN
+    | PlayerState.NOT_IN_HAND
+)
+
+INACTIVE_PLAYER_STATES = int(PlayerState.NOT_SEATED | PlayerState.SITTING_OUT)
+
+# TableInfo keeps a running count of players in each of these
+COUNTED_PLAYER_STATE_GROUPS = [
+    ACTIVE_PLAYER_STATES,
+    MAY_NEED_TO_ACT_PLAYER_STATES,
+    POT_ELIGIBLE_PLAYER_STATES,
+    ELIGIBLE_TO_PLAY_PLAYER_STATES,
+    INACTIVE_PLAYER_STATES,
+] + [int(state) for state in PlayerState]
+# the counted groups each state is in, so a state change only updates those
+COUNTED_GROUPS_BY_STATE = {
+    int(state): [group for group in COUNTED_PLAYER_STATE_GROUPS if state & group]
+    for state in PlayerState
+}
 
 
 class Suit(Enum):
@@ -125,31 +163,123 @@ class Suit(Enum):
 
 
 """
-Once exhausted a new Deck must be created
+Cards are plain ints 0-51: suit * 13 + rank (rank 0 is a 2, 12 is an Ace).
+A set of cards can also be held as a 64-bit hand mask with one 16 bit lane
+per suit, so (mask >> (16 * suit)) & 0x1FFF is that suit's rank bitmask.
+Card objects are only built to send views to clients.
 """
 
+NUM_CARDS = 52
 
-class Deck:
-    def __init__(self):
-        # self.next_deck_ind = 0
-        self.cards: List[Card] = []
-        for suit in range(4):
-            for rank in range(13):
-                self.cards.append(Card(rank, suit))
+
+def card_rank(card: int) -> int:
+    return card % 13
+
+
+def card_suit(card: int) -> int:
+    return card // 13
+
+
+def card_bit(card: int) -> int:
+    return 1 << (16 * card_suit(card) + card_rank(card))
+
+
+"""
+Shuffles read OS entropy in bulk instead of making a syscall per swap.
+Each Fisher-Yates swap index uses one byte, rejection sampled so every
+permutation is equally likely.
+"""
+
+ENTROPY_CHUNK_SIZE = 4096
+
+
+def shuffled_decks(random_bytes=os.urandom):
+    # endless stream of shuffled decks, each a bytearray permutation of 0-51
+    entropy = b""
+    pos = 0
+    while True:
+        cards = bytearray(range(NUM_CARDS))
         # https://en.wikipedia.org/wiki/Fisher%E2%80%93Yates_shuffle#The_modern_algorithm
-        sys_rand.shuffle(self.cards)
+        for i in range(NUM_CARDS - 1, 0, -1):
+            limit = 256 - 256 % (i + 1)
+            while True:
+                if pos == len(entropy):
+                    entropy = random_bytes(ENTROPY_CHUNK_SIZE)
+                    pos = 0
+                byte = entropy[pos]
+                pos += 1
+                if byte < limit:
+                    break
+            j = byte % (i + 1)
+            cards[i], cards[j] = cards[j], cards[i]
+        yield cards
+
+
+"""
+Once exhausted a new Deck must be created
+"""
+
 
-    def draw_card(self, face_up=False):
-        if len(self.cards) == 0:
+class Deck:
+    def __init__(self, cards: bytearray = None):
+        if cards is None:
+            cards = next(shuffled_decks())
+        self.cards = cards  # fixed permutation of 0-51
+        self.next_card_ind = 0  # cursor, cards before it have been drawn
+
+    def draw_card(self) -> int:
+        if self.next_card_ind == NUM_CARDS:
             raise ValueError("Deck is empty")
-        card = self.cards.pop(0)
-        card.face_up = face_up
-        # card.deck_index = self.next_deck_ind
-        # self.next_deck_ind += 1
+        card = self.cards[self.next_card_ind]
+        self.next_card_ind += 1
         return card
 
     def remaining_cards(self):
-        return len(self.cards)
+        return NUM_CARDS - self.next_card_ind
+
+
+"""
+Keeps a queue of shuffled decks filled by a background thread, so starting
+a hand just takes the next one. The thread starts on first use, and again
+in a forked child since threads don't survive a fork.
+"""
+
+
+class DeckPool:
+    def __init__(self, size=64, random_bytes=os.urandom):
+        self.size = size
+        self.random_bytes = random_bytes
+        self.decks: queue.Queue = None
+        self.filler_pid = None
+
+    def fill(self, decks: queue.Queue):
+        for cards in shuffled_decks(self.random_bytes):
+            decks.put(cards)
+
+    def next_deck(self) -> Deck:
+        if self.filler_pid != os.getpid():
+            self.filler_pid = os.getpid()
+            self.decks = queue.Queue(maxsize=self.size)
+            threading.Thread(target=self.fill, args=(self.decks,), daemon=True).start()
+        return Deck(self.decks.get())
+
+
+DECK_POOL = DeckPool()
+
+"""
+Shuffles each deck from a seeded stream when it's needed, on the caller's
+thread, so the decks only depend on the seed. Seeded tables use this
+instead of a DeckPool, which would be a filler thread and a queue of
+decks per table.
+"""
+
+
+class SeededDecks:
+    def __init__(self, seed):
+        self.decks = shuffled_decks(random.Random(seed).randbytes)
+
+    def next_deck(self) -> Deck:
+        return Deck(next(self.decks))
 
 
 class Card:
@@ -175,10 +305,9 @@ class Card:
         3: Suit.CLUBS,
     }
 
-    def __init__(self, rank, suit, face_up=False):
-        # self.deck_index = deck_index  # unique per Deck, assigned when dealt
-        self.rank = rank
-        self.suit = suit
+    def __init__(self, card: int, face_up=False):
+        self.rank = card_rank(card)
+        self.suit = card_suit(card)
         self.face_up = face_up  # if a player chooses to show their card
 
     def get_view(self, is_players_cards):
@@ -336,28 +465,48 @@ class PlayerInfo:
         self.buy_in_amount = 0
         self.stack = 0
         self.seat = seat
+        # set by the table the player joins, keeps its state counts current
+        self.table: "TableInfo" = None
         # could change if I make sure click sit
-        self.state: PlayerState = PlayerState.NOT_IN_HAND
+        self._state = PlayerState.NOT_IN_HAND
+        self.state_bit = int(self._state)  # plain int copy, for masking
         self.current_bet = 0
         # determines if action is re-opened
         self.last_full_raise_responded_to = None
         self.last_bet_responded_to = None
         self.is_all_in = False  # just for displaying to clients
         self.client_player_action: ClientPlayerAction = None
-        self.hole_cards: List[Card] = []
+        self.hole_cards: List[int] = []
+        self.hole_mask = 0
+        self.hole_cards_face_up = False  # in showdown or if I decide to show
+        # {"win": fraction, "tie": fraction} once all-in, computed by the server
+        self.equity = None
+        # best hand with the current board, updated as each street is dealt
+        self.hand_rank = None
+        self.hand_name = None
         self.stats = PlayerStats()
         self.is_connected = True  # set when socketio gets disconnect
         # Time when player's action started, used to force sit-out
         self.action_start_time = None
 
-    def get_view(self, player):
-        # if viewer is not myself, do not show my cards,
-        #  unless they have face_up = True (such as in showdown or if I decide to show)
-        # when translating PlayerState, show in terms of ClientPlayerState
-        client_player_action_view = None
-        if self.client_player_action is not None and player.sio_id == self.sio_id:
-            client_player_action_view = self.client_player_action.get_view()
-        player_is_viewer = player.sio_id == self.sio_id
+    @property
+    def state(self) -> PlayerState:
+        return self._state
+
+    @state.setter
+    def state(self, new_state: PlayerState):
+        new_state_bit = int(new_state)
+        if new_state_bit == self.state_bit:
+            return
+        if self.table is not None:
+            self.table.count_player_state(self.state_bit, -1)
+            self.table.count_player_state(new_state_bit, 1)
+        self._state = new_state
+        self.state_bit = new_state_bit
+
+    """ What every viewer sees: face down cards unless shown, no action prompt. """
+
+    def get_public_view(self):
         return {
             "name": self.name,
             "buy_in_amount": self.buy_in_amount,
@@ -366,13 +515,46 @@ class PlayerInfo:
             "state": self.state.encode(),
             "current_bet": self.current_bet,
             "is_all_in": self.is_all_in,
-            "client_player_action": client_player_action_view,
-            "hole_cards": [card.get_view(player_is_viewer) for card in self.hole_cards],
+            "client_player_action": None,
+            "hole_cards": [
+                Card(card, self.hole_cards_face_up).get_view(False)
+                for card in self.hole_cards
+            ],
+            "hand_name": self.hand_name if self.hole_cards_face_up else None,
+            "equity": self.equity,
             "stats": self.stats.get_view(),
             "is_connected": self.is_connected,
-            "is_player": player_is_viewer,
+            "is_player": False,
+        }
+
+    """ The fields only this player sees, laid over their public view, see apply_private_view. """
+
+    def get_private_view(self):
+        client_player_action_view = None
+        if self.client_player_action is not None:
+            client_player_action_view = self.client_player_action.get_view()
+        return {
+            # names are unique at a table, seats aren't once players are unseated
+            "name": self.name,
+            "seat": self.seat,
+            "client_player_action": client_player_action_view,
+            "hole_cards": [
+                Card(card, self.hole_cards_face_up).get_view(True)
+                for card in self.hole_cards
+            ],
+            "hand_name": self.hand_name,
         }
 
+    def get_view(self, player):
+        # if viewer is not myself, do not show my cards,
+        #  unless they have face_up = True (such as in showdown or if I decide to show)
+        # when translating PlayerState, show in terms of ClientPlayerState
+        view = self.get_public_view()
+        if player.sio_id == self.sio_id:
+            view.update(self.get_private_view())
+            view["is_player"] = True
+        return view
+
     def get_profit(self):
         return self.stack - self.buy_in_amount
 
@@ -425,6 +607,393 @@ class Pot:
         }
 
 
+class Positions:
+    # seats for one dealer position, see TableInfo.get_positions
+    def __init__(
+        self,
+        dealer,
+        small_blind,
+        big_blind,
+        first_to_act_preflop,
+        first_to_act_postflop,
+        action_order,
+    ):
+        self.dealer = dealer
+        self.small_blind = small_blind
+        self.big_blind = big_blind
+        self.first_to_act_preflop = first_to_act_preflop
+        self.first_to_act_postflop = first_to_act_postflop
+        # active seats clockwise, starting left of the dealer
+        self.action_order: List[int] = action_order
+
+
+NO_POSITIONS = Positions(None, None, None, None, None, [])
+
+
+"""
+Puts a player's private view over the table's public view, giving the same
+view TableInfo.get_view would have built for them. Doesn't modify either.
+"""
+
+
+def apply_private_view(public_view, private_view):
+    view = dict(public_view)
+    view["players"] = list(public_view["players"])
+    for ind, player in enumerate(view["players"]):
+        if player["name"] == private_view["name"]:
+            player = dict(player)
+            player["client_player_action"] = private_view["client_player_action"]
+            player["hole_cards"] = private_view["hole_cards"]
+            player["hand_name"] = private_view["hand_name"]
+            player["is_player"] = True
+            view["players"][ind] = player
+    return view
+
+
+"""
+Patches between two public views, so the server only sends what changed.
+A patch is a list of ops, ["s", path, value] to set and ["d", path] to
+delete, where path is the dict keys and list indices leading to the value.
+Lists that change length are sent whole.
+"""
+
+
+def diff_view(old, new, path=None, patch=None):
+    if patch is None:
+        path, patch = [], []
+    if type(old) is dict and type(new) is dict:
+        for key, value in new.items():
+            if key in old:
+                diff_view(old[key], value, path + [key], patch)
+            else:
+                patch.append(["s", path + [key], value])
+        for key in old:
+            if key not in new:
+                patch.append(["d", path + [key]])
+    elif type(old) is list and type(new) is list and len(old) == len(new):
+        for ind, (old_value, value) in enumerate(zip(old, new)):
+            diff_view(old_value, value, path + [ind], patch)
+    elif type(old) is not type(new) or old != new:
+        patch.append(["s", path, new])
+    return patch
+
+
+""" Returns view with patch applied. Only what changes is copied, view itself is left alone. """
+
+
+def apply_view_patch(view, patch):
+    view = copy.copy(view)
+    copied = {id(view)}
+    for op in patch:
+        path = op[1]
+        parent = view
+        for key in path[:-1]:
+            child = parent[key]
+            if id(child) not in copied:
+                child = copy.copy(child)
+                copied.add(id(child))
+                parent[key] = child
+            parent = child
+        if op[0] == "s":
+            parent[path[-1]] = op[2]
+        else:
+            del parent[path[-1]]
+    return view
+
+
+# patches held while waiting for a snapshot before asking for another one
+RESYNC_RETRY_PATCHES = 20
+
+
+"""
+A client's copy of its table's public view, kept current from the server's
+public_table_info messages: a snapshot of the view, or a patch from
+base_view_num to view_num. Patches that don't start from the view we have
+mean we missed one, so we hold them until a snapshot arrives.
+"""
+
+
+class TableViewStore:
+    def __init__(self):
+        self.view = None
+        self.view_num = None
+        self.resyncing = False
+        self.pending_patches = []
+
+    """ Returns True if we need a snapshot, the caller should ask the server for one. """
+
+    def receive(self, message) -> bool:
+        if "snapshot" in message:
+            if (
+                not self.resyncing
+                and self.view_num is not None
+                and message["view_num"] <= self.view_num
+            ):
+                return False
+            self.view = message["snapshot"]
+            self.view_num = message["view_num"]
+            self.resyncing = False
+            pending_patches, self.pending_patches = self.pending_patches, []
+            for ind, patch_message in enumerate(pending_patches):
+                if self.receive(patch_message):
+                    # still missing one, keep holding the rest
+                    self.pending_patches.extend(pending_patches[ind + 1 :])
+                    return True
+            return False
+        if self.resyncing:
+            self.pending_patches.append(message)
+            # the snapshot should be on its way, ask again in case it isn't
+            return len(self.pending_patches) % RESYNC_RETRY_PATCHES == 0
+        if self.view_num is not None and message["view_num"] <= self.view_num:
+            # already have it
+            return False
+        if message["base_view_num"] != self.view_num:
+            self.resyncing = True
+            self.pending_patches.append(message)
+            return True
+        self.view = apply_view_patch(self.view, message["patch"])
+        self.view_num = message["view_num"]
+        return False
+
+
+
+"""
+Binary wire format for the table updates, an alternative to sending them as
+JSON that clients can ask for when they connect (see WIRE_FORMATS). Both
+ends need the same tables below, so the format's name changes whenever
+they do.
+
+Values are a tag byte and then the value. Dict keys and enum strings that
+appear in every update are one byte indexes into WIRE_STRINGS, cards are a
+single byte, and dicts with one of the RECORD_KEYS layouts (the views and
+messages) are sent as just their values in order. Anything else falls back
+to generic ints, strings, lists and dicts, so every view round trips.
+"""
+
+BINARY_WIRE_FORMAT = "binary/1"
+# what clients can ask for, the server sends JSON to everyone else
+WIRE_FORMATS = ("json", BINARY_WIRE_FORMAT)
+
+# the key layouts of the dicts in table updates, in the order they're built
+RECORD_KEYS = [
+    # TableInfo.get_public_view
+    (
+        "name",
+        "num_seats",
+        "sm_blind",
+        "bg_blind",
+        "big_blind_seat",
+        "small_blind_seat",
+        "hand_num",
+        "players",
+        "main_pot",
+        "main_pot_including_bets",
+        "side_pots",
+        "community_cards",
+        "dealer",
+        "action_on",
+    ),
+    # PlayerInfo.get_public_view
+    (
+        "name",
+        "buy_in_amount",
+        "stack",
+        "seat",
+        "state",
+        "current_bet",
+        "is_all_in",
+        "client_player_action",
+        "hole_cards",
+        "hand_name",
+        "equity",
+        "stats",
+        "is_connected",
+        "is_player",
+    ),
+    # TableInfo.get_private_view
+    ("name", "seat", "client_player_action", "hole_cards", "hand_name", "view_num"),
+    # ClientPlayerAction.get_view
+    (
+        "hand_num",
+        "action_num",
+        "action",
+        "message",
+        "can_check",
+        "can_call",
+        "call_amount",
+        "can_raise",
+        "bet_instead_of_raise",
+        "min_raise",
+        "next_action",
+    ),
+    ("action", "bet_amount"),
+    ("pot_size", "players_eligible"),
+    ("win", "tie"),
+    # public_table_info messages, see TableViewStore
+    ("view_num", "snapshot", "sent_at"),
+    ("view_num", "base_view_num", "patch", "sent_at"),
+]
+WIRE_STRINGS = sorted({key for keys in RECORD_KEYS for key in keys}) + [
+    "s",
+    "d",
+    *(state.encode() for state in PlayerState),
+    *(state.encode() for state in ClientPlayerState),
+    *(action.encode() for action in ClientNextActionType),
+]
+CARD_KEYS = ("rank", "suit", "face_up")
+CARD_RANKS = list(Card.RANK_MAP.values()) + ["?"]
+CARD_SUITS = [suit.encode() for suit in Suit]
+
+WIRE_NONE, WIRE_FALSE, WIRE_TRUE, WIRE_INT, WIRE_FLOAT, WIRE_STR = range(6)
+WIRE_LIST, WIRE_DICT, WIRE_STRING_INDEX, WIRE_CARD, WIRE_RECORD = range(6, 11)
+
+WIRE_STRING_INDEXES = {string: ind for ind, string in enumerate(WIRE_STRINGS)}
+RECORD_INDEXES = {keys: ind for ind, keys in enumerate(RECORD_KEYS)}
+CARD_RANK_INDEXES = {rank: ind for ind, rank in enumerate(CARD_RANKS)}
+CARD_SUIT_INDEXES = {suit: ind for ind, suit in enumerate(CARD_SUITS)}
+FLOAT_STRUCT = struct.Struct("<d")
+
+
+def _write_uint(out: bytearray, n):
+    # varint, 7 bits a byte
+    while n >= 0x80:
+        out.append((n & 0x7F) | 0x80)
+        n >>= 7
+    out.append(n)
+
+
+def _read_uint(data, pos):
+    n = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        n |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return n, pos
+        shift += 7
+
+
+def _write_value(out: bytearray, value):
+    if value is None:
+        out.append(WIRE_NONE)
+    elif value is True:
+        out.append(WIRE_TRUE)
+    elif value is False:
+        out.append(WIRE_FALSE)
+    elif type(value) is int:
+        out.append(WIRE_INT)
+        # zigzag, so small negative numbers stay small
+        _write_uint(out, value * 2 if value >= 0 else -value * 2 - 1)
+    elif type(value) is float:
+        out.append(WIRE_FLOAT)
+        out += FLOAT_STRUCT.pack(value)
+    elif type(value) is str:
+        ind = WIRE_STRING_INDEXES.get(value)
+        if ind is not None:
+            out.append(WIRE_STRING_INDEX)
+            out.append(ind)
+        else:
+            encoded = value.encode()
+            out.append(WIRE_STR)
+            _write_uint(out, len(encoded))
+            out += encoded
+    elif type(value) is list:
+        out.append(WIRE_LIST)
+        _write_uint(out, len(value))
+        for item in value:
+            _write_value(out, item)
+    elif type(value) is dict:
+        keys = tuple(value)
+        record_ind = RECORD_INDEXES.get(keys)
+        if record_ind is not None:
+            out.append(WIRE_RECORD)
+            out.append(record_ind)
+            for item in value.values():
+                _write_value(out, item)
+        elif (
+            keys == CARD_KEYS
+            and value["rank"] in CARD_RANK_INDEXES
+            and value["suit"] in CARD_SUIT_INDEXES
+            and type(value["face_up"]) is bool
+        ):
+            out.append(WIRE_CARD)
+            out.append(
+                CARD_RANK_INDEXES[value["rank"]]
+                | CARD_SUIT_INDEXES[value["suit"]] << 4
+                | value["face_up"] << 7
+            )
+        else:
+            out.append(WIRE_DICT)
+            _write_uint(out, len(value))
+            for key, item in value.items():
+                _write_value(out, key)
+                _write_value(out, item)
+    else:
+        raise TypeError(f"can't put {type(value).__name__} on the wire")
+
+
+def _read_value(data, pos):
+    tag = data[pos]
+    pos += 1
+    if tag == WIRE_RECORD:
+        keys = RECORD_KEYS[data[pos]]
+        pos += 1
+        record = {}
+        for key in keys:
+            record[key], pos = _read_value(data, pos)
+        return record, pos
+    if tag == WIRE_INT:
+        n, pos = _read_uint(data, pos)
+        return (n >> 1) ^ -(n & 1), pos
+    if tag == WIRE_STRING_INDEX:
+        return WIRE_STRINGS[data[pos]], pos + 1
+    if tag == WIRE_CARD:
+        byte = data[pos]
+        card = {
+            "rank": CARD_RANKS[byte & 0xF],
+            "suit": CARD_SUITS[(byte >> 4) & 0x7],
+            "face_up": bool(byte >> 7),
+        }
+        return card, pos + 1
+    if tag == WIRE_NONE:
+        return None, pos
+    if tag == WIRE_FALSE:
+        return False, pos
+    if tag == WIRE_TRUE:
+        return True, pos
+    if tag == WIRE_LIST:
+        n, pos = _read_uint(data, pos)
+        items = []
+        for _ in range(n):
+            item, pos = _read_value(data, pos)
+            items.append(item)
+        return items, pos
+    if tag == WIRE_STR:
+        n, pos = _read_uint(data, pos)
+        return data[pos : pos + n].decode(), pos + n
+    if tag == WIRE_FLOAT:
+        return FLOAT_STRUCT.unpack_from(data, pos)[0], pos + FLOAT_STRUCT.size
+    if tag == WIRE_DICT:
+        n, pos = _read_uint(data, pos)
+        d = {}
+        for _ in range(n):
+            key, pos = _read_value(data, pos)
+            d[key], pos = _read_value(data, pos)
+        return d, pos
+    raise ValueError(f"bad wire tag {tag} at {pos - 1}")
+
+
+def encode_wire(message) -> bytes:
+    out = bytearray()
+    _write_value(out, message)
+    return bytes(out)
+
+
+def decode_wire(data: bytes):
+    message, _ = _read_value(data, 0)
+    return message
+
+
 class TableInfo:
     def __init__(self, name, num_seats, sm_blind, bg_blind):
         self.name = name  # unique among tables
@@ -434,16 +1003,31 @@ class TableInfo:
         self.game_state = GameState.GAME_NOT_STARTED
         self.process_actions_next_state = None
         self.hand_num = 1
+        # bumped by the server for every update it sends, versions the public
+        #   view and pairs it up with the private ones
+        self.view_num = 0
         self.players: List[PlayerInfo] = []
         # self.players: List[PlayerInfo] = [
         #     PlayerInfo(player["name"], player["seat"], player["sio_id"])
         #     for player in players
         # ]
+        # indexes into self.players, only change them through add_player,
+        #   unseat_player and remove_player so they stay in sync
+        self.player_by_seat: List[PlayerInfo] = [None] * num_seats
+        self.player_by_sio_id: Dict[str, PlayerInfo] = {}
+        # kept up to date by PlayerInfo.state, so counting players is O(1)
+        self.num_players_by_state: Dict[int, int] = {
+            group: 0 for group in COUNTED_PLAYER_STATE_GROUPS
+        }
         self.main_pot: Pot = Pot()
         self.side_pots: List[Pot] = []
         self.deck: Deck = None
-        self.community_cards: List[Card] = []
+        self.deck_pool: DeckPool = DECK_POOL
+        self.community_cards: List[int] = []
+        self.board_mask = 0
         self.dealer = None  # seat index
+        # cached, see get_positions
+        self.positions: Positions = None
         self.action_num = 0  # identifies which action a player is responding to
         self.action_on = None  # None if waiting for everyone?
         # used to calculate how much a call is, the max bet so far.
@@ -451,57 +1035,106 @@ class TableInfo:
         self.latest_full_raise = None  # used to calculate min raises
         self.min_raise = None
         self.hand_start_time = None
+        # replays swap in the recorded time so timeouts happen the same way
+        self.clock = time.time
         # TODO2: keep table history/log of actions
 
     def add_player(self, name, seat, sio_id):
         if name in [p.name for p in self.players]:
-            print(f"player {name} already exists in table {self.name}")
+            logger.debug("player %s already exists in table %s", name, self.name)
             return False
-        if seat not in self.get_open_seats():
-            print(f"seat {seat} is not open in table {self.name}")
+        if not 0 <= seat < self.num_seats or self.player_by_seat[seat] is not None:
+            logger.debug("seat %s is not open in table %s", seat, self.name)
             return False
-        self.players.append(PlayerInfo(name, seat, sio_id))
+        player = PlayerInfo(name, seat, sio_id)
+        player.table = self
+        self.positions = None
+        self.count_player_state(player.state_bit, 1)
+        self.players.append(player)
+        self.player_by_seat[seat] = player
+        if sio_id is not None:
+            self.player_by_sio_id[sio_id] = player
         return True
 
+    """ Takes the player out of their seat, they stay at the table. """
+
+    def unseat_player(self, player: PlayerInfo):
+        self.positions = None
+        if player.seat is not None:
+            self.player_by_seat[player.seat] = None
+        player.seat = None
+        player.state = PlayerState.NOT_SEATED
+
+    def remove_player(self, player: PlayerInfo):
+        self.positions = None
+        if player.seat is not None:
+            self.player_by_seat[player.seat] = None
+        if self.player_by_sio_id.get(player.sio_id) is player:
+            del self.player_by_sio_id[player.sio_id]
+        self.count_player_state(player.state_bit, -1)
+        player.table = None
+        self.players.remove(player)
+
     def get_player_by_sio_id(self, sio_id):
-        for player in self.players:
-            if player.sio_id == sio_id:
-                return player
-        return None
+        return self.player_by_sio_id.get(sio_id)
 
     def get_player_at_seat(self, seat: int) -> PlayerInfo:
-        for player in self.players:
-            if player.seat == seat:
-                return player
-        return None
+        if seat is None:
+            return None
+        return self.player_by_seat[seat]
 
     def get_open_seats(self):
-        return [i for i in range(self.num_seats) if self.get_player_at_seat(i) is None]
-
-    def get_num_players(self, filter):
-        return len([p for p in self.players if p.state in filter])
+        return [
+            seat for seat, player in enumerate(self.player_by_seat) if player is None
+        ]
+
+    def count_player_state(self, state_bit: int, change: int):
+        num_players_by_state = self.num_players_by_state
+        for group in COUNTED_GROUPS_BY_STATE[state_bit]:
+            num_players_by_state[group] += change
+
+    def get_num_players(self, filter: int):
+        count = self.num_players_by_state.get(filter)
+        if count is None:
+            # not a group we count, add up its states
+            count = sum(
+                self.num_players_by_state[int(state)]
+                for state in PlayerState
+                if state & filter
+            )
+        return count
 
     def get_num_players_not(self, filter):
-        return len([p for p in self.players if p.state not in filter])
+        return len(self.players) - self.get_num_players(filter)
 
     def get_num_active_players(self):
-        return self.get_num_players_not(
-            [PlayerState.NOT_SEATED, PlayerState.SITTING_OUT]
-        )
+        return self.get_num_players_not(INACTIVE_PLAYER_STATES)
+
+    """
+    Recounts players in each counted state group and asserts the running
+    counts agree. The engine runs it on every transition when debug logging
+    is on (e.g. replay.py --verbose).
+    """
+
+    def check_player_counts(self):
+        for group in COUNTED_PLAYER_STATE_GROUPS:
+            count = sum(1 for player in self.players if player.state_bit & group)
+            assert self.num_players_by_state[group] == count, (
+                f"table {self.name} counts {self.num_players_by_state[group]}"
+                f" players in states {group}, there are {count}"
+            )
 
-    def get_first_seat_starting_at(
-        self, start_seat: int, filter: List[PlayerState]
-    ) -> int:
+    def get_first_seat_starting_at(self, start_seat: int, filter: int) -> int:
+        player_by_seat = self.player_by_seat
+        filter = int(filter)
         for i in range(self.num_seats):
             seat = (start_seat + i) % self.num_seats
-            if (
-                self.get_player_at_seat(seat) is not None
-                and self.get_player_at_seat(seat).state in filter
-            ):
+            player = player_by_seat[seat]
+            if player is not None and player.state_bit & filter:
                 return seat
         return None
 
-    def get_next_seat(self, start_seat: int, filter: List[PlayerState]) -> int:
+    def get_next_seat(self, start_seat: int, filter: int) -> int:
         return self.get_first_seat_starting_at(
             (start_seat + 1) % self.num_seats, filter
         )
@@ -509,41 +1142,71 @@ class TableInfo:
     def is_heads_up(self) -> bool:
         return self.get_num_active_players() == 2
 
-    def get_small_blind_seat(self) -> int:
-        if self.dealer is None:
-            return None
-        if self.is_heads_up():
-            return self.dealer
+    """
+    Seats of the blinds and first to act, and the action order. They only
+    change when the dealer moves or someone sits down, stands up or leaves,
+    so they're worked out once and reused until one of those happens.
+    """
+
+    def get_positions(self) -> Positions:
+        positions = self.positions
+        if positions is None or positions.dealer != self.dealer:
+            positions = self.positions = self.compute_positions()
+        return positions
+
+    def compute_positions(self) -> Positions:
+        dealer = self.dealer
+        if dealer is None:
+            return NO_POSITIONS
+        heads_up = self.is_heads_up()
+        if heads_up:
+            small_blind = dealer
         else:
-            return self.get_next_seat(self.dealer, ACTIVE_PLAYER_STATES)
+            small_blind = self.get_next_seat(dealer, ACTIVE_PLAYER_STATES)
+        big_blind = self.get_next_seat(small_blind, ACTIVE_PLAYER_STATES)
+        if heads_up:
+            first_to_act_preflop = small_blind
+            first_to_act_postflop = big_blind
+        else:
+            first_to_act_preflop = self.get_next_seat(big_blind, ACTIVE_PLAYER_STATES)
+            first_to_act_postflop = self.get_next_seat(dealer, ACTIVE_PLAYER_STATES)
+        action_order = []
+        seat = self.get_next_seat(dealer, ACTIVE_PLAYER_STATES)
+        while seat is not None and seat not in action_order:
+            action_order.append(seat)
+            seat = self.get_next_seat(seat, ACTIVE_PLAYER_STATES)
+        return Positions(
+            dealer,
+            small_blind,
+            big_blind,
+            first_to_act_preflop,
+            first_to_act_postflop,
+            action_order,
+        )
+
+    def get_small_blind_seat(self) -> int:
+        return self.get_positions().small_blind
 
     def get_big_blind_seat(self) -> int:
-        if self.dealer is None:
-            return None
-        if self.is_heads_up():
-            return self.get_next_seat(self.get_small_blind_seat(), ACTIVE_PLAYER_STATES)
-        else:
-            return self.get_next_seat(self.get_small_blind_seat(), ACTIVE_PLAYER_STATES)
+        return self.get_positions().big_blind
 
     def get_first_to_act_preflop(self) -> int:
-        if self.is_heads_up():
-            return self.get_small_blind_seat()
-        else:
-            return self.get_next_seat(self.get_big_blind_seat(), ACTIVE_PLAYER_STATES)
+        return self.get_positions().first_to_act_preflop
 
     def get_first_to_act_postflop(self) -> int:
-        if self.is_heads_up():
-            return self.get_big_blind_seat()
-        else:
-            return self.get_next_seat(self.dealer, ACTIVE_PLAYER_STATES)
+        return self.get_positions().first_to_act_postflop
 
     def pay_blinds(self):
-        print(f"dealer: {self.dealer}")
         small_blind_seat = self.get_small_blind_seat()
-        print(f"small_blind_seat: {small_blind_seat}")
         big_blind_seat = self.get_big_blind_seat()
-        print(f"big_blind_seat: {big_blind_seat}")
-        print(f"player seats: {[p.seat for p in self.players]}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                "dealer: %s small_blind_seat: %s big_blind_seat: %s player seats: %s",
+                self.dealer,
+                small_blind_seat,
+                big_blind_seat,
+                [p.seat for p in self.players],
+            )
         small_blind_player = self.get_player_at_seat(small_blind_seat)
         big_blind_player = self.get_player_at_seat(big_blind_seat)
         sm_blind_charged = min(self.sm_blind, small_blind_player.stack)
@@ -567,31 +1230,33 @@ class TableInfo:
     def deal_card_to_player(self, player: PlayerInfo):
         card = self.deck.draw_card()
         player.hole_cards.append(card)
+        player.hole_mask |= card_bit(card)
 
     def deal_hole_cards(self):
-        seat = self.get_next_seat(self.dealer, ACTIVE_PLAYER_STATES)
-        while any(
-            len(player.hole_cards) < 2
-            for player in self.players
-            if player.state == PlayerState.IN_HAND
-        ):
-            player = self.get_player_at_seat(seat)
-            if player.state == PlayerState.IN_HAND:
-                self.deal_card_to_player(player)
-            seat = self.get_next_seat(seat, ACTIVE_PLAYER_STATES)
+        # one card at a time around the table, twice
+        action_order = self.get_positions().action_order
+        for _ in range(2):
+            for seat in action_order:
+                player = self.get_player_at_seat(seat)
+                # includes blinds who were put all-in by posting
+                if player.state_bit & POT_ELIGIBLE_PLAYER_STATES:
+                    self.deal_card_to_player(player)
 
     def new_hand_reset_state(self):
+        # players waiting for this hand join it
+        self.positions = None
         self.process_actions_next_state = None
         self.main_pot = Pot()
         self.side_pots = []
-        self.deck = Deck()
+        self.deck = self.deck_pool.next_deck()
         self.community_cards = []
+        self.board_mask = 0
         self.latest_bet = 0
         self.latest_full_raise = None
         self.min_raise = None
-        self.hand_start_time = time.time()
+        self.hand_start_time = self.clock()
         for player in self.players:
-            if player.state in ELIGIBLE_TO_PLAY_PLAYER_STATES:
+            if player.state_bit & ELIGIBLE_TO_PLAY_PLAYER_STATES:
                 player.state = PlayerState.IN_HAND
                 player.current_bet = 0
                 player.last_full_raise_responded_to = None
@@ -599,6 +1264,11 @@ class TableInfo:
                 player.is_all_in = False
                 player.client_player_action = None
                 player.hole_cards = []
+                player.hole_mask = 0
+                player.hole_cards_face_up = False
+                player.equity = None
+                player.hand_rank = None
+                player.hand_name = None
 
     def new_street_reset_player_bet_info(self):
         self.process_actions_next_state = None
@@ -606,7 +1276,7 @@ class TableInfo:
         self.latest_full_raise = 0
         self.min_raise = self.bg_blind
         for player in self.players:
-            if player.state in MAY_NEED_TO_ACT_PLAYER_STATES:
+            if player.state_bit & MAY_NEED_TO_ACT_PLAYER_STATES:
                 player.state = PlayerState.IN_HAND
                 player.current_bet = 0
                 player.last_full_raise_responded_to = None
@@ -625,16 +1295,20 @@ class TableInfo:
 
     def perform_next_player_action(self):
         p: PlayerInfo = self.get_player_at_seat(self.action_on)
-        if p.client_player_action is None:
+        if p is None or p.client_player_action is None:
             return
 
         # temporary until I add a menu option to force kick players (no vote)
-        if time.time() - p.action_start_time > 60 * 5:
-            p.state = PlayerState.NOT_SEATED
-            p.seat = None
+        if self.clock() - p.action_start_time > ACTION_TIMEOUT:
+            self.unseat_player(p)
             p.client_player_action = None
             p.action_start_time = None
-            print(f"player {p.name} timed out\n\n")
+            logger.debug("player %s timed out", p.name)
+            # their seat is empty now, so the action moves on without them
+            self.action_num += 1
+            self.action_on = self.get_next_seat(
+                self.action_on, MAY_NEED_TO_ACT_PLAYER_STATES
+            )
             return
 
         # client hasn't sent their action yet
@@ -654,7 +1328,7 @@ class TableInfo:
         elif p.client_player_action.next_action.action == ClientNextActionType.CALL:
             # call is the min(last bet, stack)
             call_amt = min(self.latest_bet, p.stack + p.current_bet)
-            if call_amt == p.stack:
+            if call_amt == p.stack + p.current_bet:
                 if p.bet(call_amt) is not None:
                     # bet should always work
                     p.last_full_raise_responded_to = self.latest_full_raise
@@ -725,9 +1399,12 @@ class TableInfo:
         #     pass
         else:
             raise ValueError("Invalid action")
+        if p.client_player_action is not None:
+            # action was rejected (e.g. check facing a bet), wait for a valid one
+            p.client_player_action.next_action = None
 
     def initialize_client_player_action(self, player):
-        player.action_start_time = time.time()
+        player.action_start_time = self.clock()
         can_check = player.current_bet == self.latest_bet
         can_call = player.current_bet < self.latest_bet
         call_amount = min(self.latest_bet, player.stack + player.current_bet)
@@ -751,29 +1428,23 @@ class TableInfo:
         )
 
     """
-    Stays at current player if they're not done, otherwise goes to next player who needs to act
+    Stays at current player if they're not done, otherwise goes to seat, the
+    next player who needs to act (see get_next_seat_to_act).
     """
 
-    def goToNextActionOnIfDone(self):
-        if self.player_needs_to_act(self.get_player_at_seat(self.action_on)):
+    def goToNextActionOnIfDone(self, seat):
+        moved = seat != self.action_on
+        if moved:
             p = self.get_player_at_seat(self.action_on)
-            if p.client_player_action is None:
-                self.initialize_client_player_action(p)
-            return False
-
-        self.get_player_at_seat(self.action_on).client_player_action = None
-        self.action_num += 1
-        self.action_on = self.get_next_seat(
-            self.action_on, MAY_NEED_TO_ACT_PLAYER_STATES
-        )
-        # if not self.player_needs_to_act(self.get_player_at_seat(self.action_on)):
-        #     return None
+            if p is not None:
+                p.client_player_action = None
+            self.action_num += 1
+            self.action_on = seat
         # set their client_player_action (allows incoming next actions to come in)
-        p = self.get_player_at_seat(self.action_on)
-        # assert p.client_player_action is None
-        if self.player_needs_to_act(p) and p.client_player_action is None:
+        p = self.get_player_at_seat(seat)
+        if p.client_player_action is None:
             self.initialize_client_player_action(p)
-        return True
+        return moved
 
     def update_pots(self):
         # split pot into side pots for all-ins
@@ -782,13 +1453,15 @@ class TableInfo:
             if player.current_bet > 0:
                 players_who_bet_money.append(player)
         players_who_bet_money.sort(key=lambda x: x.current_bet)
-        print("UPDATE POTS")
-        for player in players_who_bet_money:
-            print(f"{player.name} current_bet: {player.current_bet}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                "update pots, current bets: %s",
+                [(p.name, p.current_bet) for p in players_who_bet_money],
+            )
         while len(players_who_bet_money) > 0:
             lowest_committed_bet = players_who_bet_money[0].current_bet
             # if this player isn't eligible, just add to main pot
-            if players_who_bet_money[0].state not in POT_ELIGIBLE_PLAYER_STATES:
+            if not players_who_bet_money[0].state_bit & POT_ELIGIBLE_PLAYER_STATES:
                 self.main_pot.pot_size += lowest_committed_bet
                 players_who_bet_money[0].current_bet = 0
                 players_who_bet_money.pop(0)
@@ -810,7 +1483,7 @@ class TableInfo:
                     self.main_pot.players_eligible = [
                         player
                         for player in players_who_bet_money
-                        if player.state in POT_ELIGIBLE_PLAYER_STATES
+                        if player.state_bit & POT_ELIGIBLE_PLAYER_STATES
                     ]
                     self.side_pots.append(self.main_pot)
                     self.main_pot = Pot()
@@ -887,7 +1560,8 @@ class TableInfo:
                 kickers.append(rank)
         if three_of_a_kind is not None:
             kickers.sort(reverse=True)
-            return (True, three_of_a_kind, kickers[0], kickers[1])
+            # a full house only has 1 other rank
+            return (True, three_of_a_kind, *kickers)
         return (False,)
 
     def is_2_pair(self, cards: List[Card]) -> tuple[bool, int, int]:
@@ -925,9 +1599,10 @@ class TableInfo:
             return (True, pair, kickers[0], kickers[1], kickers[2])
         return (False,)
 
+    # slow reference implementation, used to cross-check evaluator.evaluate
     def hand_strength(self, player: PlayerInfo) -> int:
         # get all combinations of 5 cards from community_cards + player.hole_cards
-        all_cards = self.community_cards + player.hole_cards
+        all_cards = [Card(c) for c in self.community_cards + player.hole_cards]
         combinations = []
         for i in range(len(all_cards)):
             for j in range(i + 1, len(all_cards)):
@@ -952,12 +1627,12 @@ class TableInfo:
             is_2_pair = self.is_2_pair(cards)
             is_pair = self.is_pair(cards)
             hand_strength = None
-            if is_straight[0] and is_flush[0] and self.max_card_rank(cards) == 12:
+            if is_straight[0] and is_flush[0] and is_straight[1] == 12:
                 # Royal Flush
                 hand_strength = (10,)
             elif is_straight[0] and is_flush[0]:
-                # straight flush
-                hand_strength = (9, self.max_card_rank(cards))
+                # straight flush, a steel wheel is 5 high not ace high
+                hand_strength = (9, is_straight[1])
             elif is_4_of_a_kind[0]:
                 # 4 of a kind
                 hand_strength = (8, is_4_of_a_kind[1:])
@@ -987,7 +1662,11 @@ class TableInfo:
         return best_hand_strength
 
     def calculate_winning_players(self, players_eligible) -> List[PlayerInfo]:
-        hand_strengths = [(self.hand_strength(p), p) for p in players_eligible]
+        if len(players_eligible) == 1:
+            # everyone else folded, there may not be a full board to evaluate
+            return players_eligible
+        # hand ranks are kept up to date by add_n_cards_to_board
+        hand_strengths = [(p.hand_rank, p) for p in players_eligible]
         best_hand_strength = max(hand_strengths, key=lambda x: x[0])[0]
         return [p for (hs, p) in hand_strengths if hs == best_hand_strength]
 
@@ -1004,13 +1683,17 @@ class TableInfo:
     def distribute_side_pot_to_winners(self, pot):
         self.distribute_pot_to_winners(
             pot,
-            [p for p in pot.players_eligible if p.state in POT_ELIGIBLE_PLAYER_STATES],
+            [
+                p
+                for p in pot.players_eligible
+                if p.state_bit & POT_ELIGIBLE_PLAYER_STATES
+            ],
         )
 
     def distribute_main_pot_to_winners(self):
         self.distribute_pot_to_winners(
             self.main_pot,
-            [p for p in self.players if p.state in POT_ELIGIBLE_PLAYER_STATES],
+            [p for p in self.players if p.state_bit & POT_ELIGIBLE_PLAYER_STATES],
         )
 
     # if there's a split pot, odd chips go to earliest position
@@ -1025,57 +1708,98 @@ class TableInfo:
 
     def show_eligible_players_cards(self):
         for player in self.players:
-            if player.state in POT_ELIGIBLE_PLAYER_STATES:
-                for card in player.hole_cards:
-                    card.face_up = True
+            if player.state_bit & POT_ELIGIBLE_PLAYER_STATES:
+                player.hole_cards_face_up = True
 
     def add_n_cards_to_board(self, n):
         for _ in range(n):
-            self.community_cards.append(self.deck.draw_card(face_up=True))
+            card = self.deck.draw_card()
+            self.community_cards.append(card)
+            self.board_mask |= card_bit(card)
+        # equity was for the old board, until it's recalculated
+        for player in self.players:
+            player.equity = None
+        self.update_hand_ranks()
+
+    def update_hand_ranks(self):
+        if len(self.community_cards) < 3:
+            return
+        for player in self.players:
+            if player.state_bit & POT_ELIGIBLE_PLAYER_STATES:
+                player.hand_rank = evaluator.evaluate_mask(
+                    self.board_mask | player.hole_mask
+                )
+                player.hand_name = evaluator.hand_name(player.hand_rank)
 
     """ Goes to Showdown if >= 2 players in hand and everyone except for one is all-in or more.
      Goes to End Hand if there's only 1 person left. Otherwise goes to next_state."""
 
     def go_to_showdown_or_end_hand_else(self, next_state):
-        if self.get_num_players(POT_ELIGIBLE_PLAYER_STATES) == 1:
+        num_pot_eligible = self.get_num_players(POT_ELIGIBLE_PLAYER_STATES)
+        if num_pot_eligible == 1:
             self.game_state = GameState.END_HAND
         elif (
-            self.get_num_players(POT_ELIGIBLE_PLAYER_STATES) > 1
-            and self.get_num_players([PlayerState.ALL_IN])
-            >= self.get_num_players(POT_ELIGIBLE_PLAYER_STATES) - 1
+            num_pot_eligible > 1
+            and self.num_players_by_state[PlayerState.ALL_IN] >= num_pot_eligible - 1
         ):
             self.game_state = GameState.SHOWDOWN
         else:
             self.game_state = next_state
 
-    def some_player_needs_to_act(self):
-        if self.get_num_players(POT_ELIGIBLE_PLAYER_STATES) == 1:
+    """
+    Seat of the next player who needs to act, starting with the one the
+    action is on, or None once the betting round is over. Betting goes
+    around the table in order, so this usually stops at the first seat or
+    two instead of checking every player.
+    """
+
+    def get_next_seat_to_act(self):
+        num_pot_eligible = self.get_num_players(POT_ELIGIBLE_PLAYER_STATES)
+        if num_pot_eligible == 1:
             # if everyone but 1 folded
-            return False
-        elif (
-            self.get_num_players(POT_ELIGIBLE_PLAYER_STATES)
-            - self.get_num_players([PlayerState.ALL_IN])
-            == 1
-        ):
-            # if everyone but 1 is all-in
-            return False
-        return any(self.player_needs_to_act(player) for player in self.players)
+            return None
+        # if everyone but 1 is all-in, they only act if they haven't called yet
+        must_call = (
+            num_pot_eligible - self.num_players_by_state[PlayerState.ALL_IN] == 1
+        )
+        start_seat = self.action_on if self.action_on is not None else 0
+        player_by_seat = self.player_by_seat
+        latest_bet = self.latest_bet
+        for i in range(self.num_seats):
+            seat = (start_seat + i) % self.num_seats
+            player = player_by_seat[seat]
+            # player_needs_to_act, inlined since this runs after every action
+            if (
+                player is not None
+                and player.state_bit & MAY_NEED_TO_ACT_PLAYER_STATES
+                and player.last_bet_responded_to != latest_bet
+                and (not must_call or player.current_bet < latest_bet)
+            ):
+                return seat
+        return None
+
+    def some_player_needs_to_act(self):
+        return self.get_next_seat_to_act() is not None
 
     def player_needs_to_act(self, player: PlayerInfo):
-        if player.state not in MAY_NEED_TO_ACT_PLAYER_STATES:
-            print(f"player_needs_to_act: {player.name} false")
-            return False
-        if player.state == PlayerState.ALL_IN or player.state == PlayerState.FOLDED:
-            print(f"player_needs_to_act: {player.name} false 2")
-            return False
-        # edge case of BB preflop
-        if player.last_bet_responded_to == self.latest_bet:
-            print(f"player_needs_to_act: {player.name} false 3")
-            return False
-        print(f"player_needs_to_act: {player.name} true")
-        return True
+        # MAY_NEED_TO_ACT leaves out players who are all in or folded, and
+        # edge case of BB preflop: they may have responded to the bet already
+        needs_to_act = bool(
+            player.state_bit & MAY_NEED_TO_ACT_PLAYER_STATES
+            and player.last_bet_responded_to != self.latest_bet
+        )
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("player_needs_to_act: %s %s", player.name, needs_to_act)
+        return needs_to_act
 
-    def get_view(self, player):
+    """
+    The part of the view that's the same for every player at the table, so
+    the server builds and serializes it once per update. Each player also
+    gets their get_private_view, clients put them together with
+    apply_private_view.
+    """
+
+    def get_public_view(self):
         main_pot_including_bets = self.main_pot.pot_size + sum(
             p.current_bet for p in self.players
         )
@@ -1087,11 +1811,22 @@ class TableInfo:
             "big_blind_seat": self.get_big_blind_seat(),
             "small_blind_seat": self.get_small_blind_seat(),
             "hand_num": self.hand_num,
-            "players": [p.get_view(player) for p in self.players],
+            "players": [p.get_public_view() for p in self.players],
             "main_pot": self.main_pot.get_view(),
             "main_pot_including_bets": main_pot_including_bets,
             "side_pots": [pot.get_view() for pot in self.side_pots],
-            "community_cards": [card.get_view(player) for card in self.community_cards],
+            "community_cards": [
+                Card(card, face_up=True).get_view(False)
+                for card in self.community_cards
+            ],
             "dealer": self.dealer,
             "action_on": self.action_on,
         }
+
+    def get_private_view(self, player):
+        view = player.get_private_view()
+        view["view_num"] = self.view_num
+        return view
+
+    def get_view(self, player):
+        return apply_private_view(self.get_public_view(), self.get_private_view(player))